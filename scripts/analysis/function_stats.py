@@ -11,12 +11,19 @@ from __future__ import annotations
 import argparse
 import csv
 import json
-from collections import Counter, defaultdict
+import mmap
+from collections import Counter
 from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
+from typing import Iterator
 
 import sys
 
+try:
+    import simdjson
+except ImportError:  # pragma: no cover - optional speedup
+    simdjson = None
+
 REPO_ROOT = Path(__file__).resolve().parents[2]
 if str(REPO_ROOT) not in sys.path:
     sys.path.append(str(REPO_ROOT))
@@ -26,55 +33,102 @@ from scripts.utils.function_alias import (
     load_alias_map,
     save_alias_map,
 )
+from scripts.utils.has_utils import find_jsonl_files, loads_json
+
+# Top-level keys read by extract_functions; everything else in a record is skipped.
+RECORD_FIELDS = ("available_tools", "messages", "metadata")
+
+# Lower bound for byte-range chunks when a few large shards are split across workers.
+MIN_CHUNK_BYTES = 64 * 1024 * 1024
+
+# Read-ahead for the buffered fallback; far fewer read() syscalls than the 8 KiB default.
+# Larger than has_utils.READ_BUFFER_BYTES because this path only serves shards mmap rejects.
+STATS_READ_BUFFER_BYTES = 4 * 1024 * 1024
 
 
 def iter_jsonl_files(root: Path) -> list[Path]:
     if root.is_file():
         return [root]
-    return sorted(root.rglob("*.jsonl"))
+    return find_jsonl_files(root)
+
+
+def _project_fields(parser, line: bytes) -> tuple:
+    """Parse a jsonl line with simdjson and materialize only RECORD_FIELDS."""
+    doc = parser.parse(line)
+    fields = []
+    for key in RECORD_FIELDS:
+        value = doc.get(key)
+        # Proxies point into the parser buffer, which is reused for the next line.
+        if isinstance(value, simdjson.Object):
+            value = value.as_dict()
+        elif isinstance(value, simdjson.Array):
+            value = value.as_list()
+        fields.append(value)
+    return tuple(fields)
+
+
+def _load_fields(line: bytes, loads=loads_json) -> tuple:
+    """Parse a jsonl line and return the RECORD_FIELDS values in order."""
+    record = loads(line)
+    get = record.get
+    return tuple(get(key) for key in RECORD_FIELDS)
+
+
+def _maybe_load(value):
+    """Decode a field Toucan stores as a JSON-encoded string; pass other values through."""
+    if isinstance(value, (str, bytes)):
+        try:
+            return loads_json(value)
+        except json.JSONDecodeError:
+            return None
+    return value
+
 
+def extract_functions(available, messages, metadata, collect_meta: bool = True):
+    """Collect function names (and first-seen tool specs) from the RECORD_FIELDS values.
 
-def extract_functions(record: dict):
+    Walks the fixed paths available_tools[].function.name,
+    messages[].function_call.name and
+    metadata.mcp_servers[].remote_server_response.tools[].name.
+    Tool specs are only captured when collect_meta is set.
+    """
     funcs: list[str] = []
+    add = funcs.append
     tool_meta: dict[str, dict] = {}
-    available = record.get("available_tools")
-    try:
-        tools = json.loads(available) if isinstance(available, str) else available
-    except (TypeError, json.JSONDecodeError):
-        tools = None
+
+    tools = _maybe_load(available)
     if isinstance(tools, list):
         for tool in tools:
-            func = tool.get("function", {})
+            func = tool.get("function")
+            if not isinstance(func, dict):
+                continue
             name = func.get("name")
             if name:
-                funcs.append(name)
-                tool_meta.setdefault(name, func)
-    messages = record.get("messages")
-    if isinstance(messages, str):
-        try:
-            messages = json.loads(messages)
-        except json.JSONDecodeError:
-            messages = None
+                add(name)
+                if collect_meta and name not in tool_meta:
+                    tool_meta[name] = func
+
+    messages = _maybe_load(messages)
     if isinstance(messages, list):
         for msg in messages:
             fc = msg.get("function_call")
-            if fc and fc.get("name"):
-                funcs.append(fc["name"])
-    metadata = record.get("metadata")
-    if isinstance(metadata, str):
-        try:
-            metadata = json.loads(metadata)
-        except json.JSONDecodeError:
-            metadata = None
+            if fc:
+                name = fc.get("name")
+                if name:
+                    add(name)
+
+    metadata = _maybe_load(metadata)
     if isinstance(metadata, dict):
-        server_info = metadata.get("mcp_servers") or []
-        for server in server_info:
-            resp = server.get("remote_server_response", {})
-            for tool in resp.get("tools", []):
+        for server in metadata.get("mcp_servers") or ():
+            resp = server.get("remote_server_response")
+            if not isinstance(resp, dict):
+                continue
+            for tool in resp.get("tools") or ():
                 name = tool.get("name")
                 if name:
-                    funcs.append(name)
-                    tool_meta.setdefault(name, tool)
+                    add(name)
+                    if collect_meta and name not in tool_meta:
+                        tool_meta[name] = tool
     return funcs, tool_meta
 
 
@@ -97,8 +151,8 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument(
         "--meta-output",
         type=Path,
-        default=Path("function_meta.json"),
-        help="JSON file to store function metadata (default: function_meta.json).",
+        default=None,
+        help="Optional JSON file to store function metadata; skipped entirely when omitted.",
     )
     parser.add_argument(
         "--top",
@@ -127,23 +181,114 @@ def parse_args() -> argparse.Namespace:
     return parser.parse_args()
 
 
-def process_file(file: Path) -> tuple[Counter[str], dict[str, dict], int]:
-    local_counter: Counter[str] = Counter()
+def plan_chunks(files: list[Path], workers: int) -> list[tuple[Path, int, int | None]]:
+    """Split files into (path, start, end) byte ranges when there are fewer files than workers."""
+    if len(files) >= workers:
+        return [(file, 0, None) for file in files]
+    sizes = {file: file.stat().st_size for file in files}
+    chunk_bytes = max(MIN_CHUNK_BYTES, -(-sum(sizes.values()) // workers))
+    chunks: list[tuple[Path, int, int | None]] = []
+    for file in files:
+        size = sizes[file]
+        if size <= chunk_bytes:
+            chunks.append((file, 0, None))
+            continue
+        for start in range(0, size, chunk_bytes):
+            chunks.append((file, start, min(start + chunk_bytes, size)))
+    return chunks
+
+
+def describe_chunk(file: Path, start: int, end: int | None) -> str:
+    if start == 0 and end is None:
+        return str(file)
+    return f"{file} [{start}:{end}]"
+
+
+def iter_lines(file: Path, start: int = 0, end: int | None = None) -> Iterator[bytes]:
+    """Yield raw lines (without the newline) that start inside [start, end) of file.
+
+    The file is memory-mapped and split with mmap.find, so line boundaries are
+    located by a C scan instead of a Python-level readline per record.
+    """
+    size = file.stat().st_size
+    if size == 0:
+        return
+    stop = size if end is None else min(end, size)
+    with file.open("rb") as fh:
+        try:
+            mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            yield from _iter_buffered_lines(file, start, stop)
+            return
+    with mm:
+        if hasattr(mm, "madvise") and hasattr(mmap, "MADV_SEQUENTIAL"):
+            # Read ahead aggressively and let the kernel drop pages already scanned,
+            # so worker RSS stays flat on shards larger than RAM.
+            mm.madvise(mmap.MADV_SEQUENTIAL)
+        find = mm.find
+        pos = start
+        if start > 0:
+            # Skip the line straddling the boundary; the previous chunk owns it.
+            nl = find(b"\n", start - 1)
+            pos = size if nl == -1 else nl + 1
+        while pos < stop:
+            nl = find(b"\n", pos)
+            if nl == -1:
+                nl = size
+            yield mm[pos:nl]
+            pos = nl + 1
+
+
+def _iter_buffered_lines(file: Path, start: int, stop: int) -> Iterator[bytes]:
+    """Same contract as iter_lines, for files that cannot be memory-mapped."""
+    with file.open("rb", buffering=STATS_READ_BUFFER_BYTES) as fh:
+        pos = start
+        if start > 0:
+            fh.seek(start - 1)
+            pos = start - 1 + len(fh.readline())
+        for raw in fh:
+            if pos >= stop:
+                break
+            pos += len(raw)
+            yield raw[:-1] if raw.endswith(b"\n") else raw
+
+
+def process_file(
+    file: Path, start: int = 0, end: int | None = None, collect_meta: bool = True
+) -> tuple[dict[str, int], dict[str, dict], int]:
+    """Count functions for lines that start inside the [start, end) byte range of file."""
+    # Plain dict + get() avoids Counter.__missing__ on first sight of each name.
+    local_counter: dict[str, int] = {}
+    count_get = local_counter.get
     local_meta: dict[str, dict] = {}
     local_total = 0
-    with file.open("r", encoding="utf-8") as fh:
-        for line in fh:
-            line = line.strip()
-            if not line:
-                continue
-            local_total += 1
-            try:
-                record = json.loads(line)
-            except json.JSONDecodeError:
-                continue
-            funcs, meta = extract_functions(record)
-            for name in funcs:
-                local_counter[name] += 1
+    parser = simdjson.Parser() if simdjson is not None else None
+    for line in iter_lines(file, start, end):
+        # Parsers tolerate surrounding whitespace, so only blank lines need a check.
+        if not line or line.isspace():
+            continue
+        local_total += 1
+        try:
+            if parser is not None:
+                try:
+                    fields = _project_fields(parser, line)
+                except (ValueError, RuntimeError):
+                    # simdjson rejects malformed input (ValueError) and integers wider
+                    # than 64 bits (RuntimeError: BIGINT_ERROR); stdlib json keeps such
+                    # integers exact, so it gets the final say.
+                    fields = _load_fields(line, json.loads)
+            else:
+                fields = _load_fields(line)
+        except ValueError:
+            continue
+        funcs, meta = extract_functions(*fields, collect_meta)
+        for name in funcs:
+            count = count_get(name)
+            if count is None:
+                local_counter[sys.intern(name)] = 1
+            else:
+                local_counter[name] = count + 1
+        if collect_meta:
             for name, info in meta.items():
                 local_meta.setdefault(name, info)
     return local_counter, local_meta, local_total
@@ -158,28 +303,30 @@ def main() -> None:
     counter: Counter[str] = Counter()
     total_records = 0
     meta_store: dict[str, dict] = {}
+    collect_meta = args.meta_output is not None
 
     workers = max(1, args.workers)
     print(f"[INFO] Found {len(files)} jsonl files. Processing with {workers} worker(s).")
-    if workers == 1 or len(files) == 1:
-        for file in files:
-            print(f"[INFO] Processing {file}")
-            local_counter, local_meta, local_total = process_file(file)
+    chunks = plan_chunks(files, workers)
+    if workers == 1 or len(chunks) == 1:
+        for chunk in chunks:
+            print(f"[INFO] Processing {describe_chunk(*chunk)}")
+            local_counter, local_meta, local_total = process_file(*chunk, collect_meta)
             counter.update(local_counter)
             total_records += local_total
             for name, info in local_meta.items():
                 meta_store.setdefault(name, info)
     else:
         with ProcessPoolExecutor(max_workers=workers) as executor:
-            futures = {executor.submit(process_file, file): file for file in files}
+            futures = {executor.submit(process_file, *chunk, collect_meta): chunk for chunk in chunks}
             for future in as_completed(futures):
-                file = futures[future]
+                label = describe_chunk(*futures[future])
                 try:
                     local_counter, local_meta, local_total = future.result()
                 except Exception as exc:
-                    print(f"[WARN] Failed processing {file}: {exc}")
+                    print(f"[WARN] Failed processing {label}: {exc}")
                     continue
-                print(f"[INFO] Finished {file} (records: {local_total})")
+                print(f"[INFO] Finished {label} (records: {local_total})")
                 counter.update(local_counter)
                 total_records += local_total
                 for name, info in local_meta.items():
@@ -190,15 +337,14 @@ def main() -> None:
     with args.output.open("w", newline="", encoding="utf-8") as csvfile:
         writer = csv.writer(csvfile)
         writer.writerow(["function_name", "count"])
-        for name, count in items:
-            writer.writerow([name, count])
-    with args.meta_output.open("w", encoding="utf-8") as metaj:
-        json.dump(meta_store, metaj, ensure_ascii=False, indent=2)
+        writer.writerows(items)
+    if collect_meta:
+        with args.meta_output.open("w", encoding="utf-8") as metaj:
+            json.dump(meta_store, metaj, ensure_ascii=False, indent=2)
 
     print(f"Processed {total_records} records from {len(files)} files.")
-    print(
-        f"Unique functions: {len(counter)}. Count CSV: {args.output}. Metadata JSON: {args.meta_output}."
-    )
+    meta_note = f"Metadata JSON: {args.meta_output}." if collect_meta else "Metadata skipped (no --meta-output)."
+    print(f"Unique functions: {len(counter)}. Count CSV: {args.output}. {meta_note}")
 
     if args.alias_output:
         existing = {}
@@ -8,13 +8,29 @@ Example:
 
 import argparse
 import json
+import re
+import sys
+from functools import partial
 from pathlib import Path
 from textwrap import indent
 
 import yaml
 
+try:
+    from yaml import CSafeDumper as _SafeDumper
+except ImportError:  # pragma: no cover - PyYAML built without libyaml
+    from yaml import SafeDumper as _SafeDumper
+
+# libyaml's emitter is several times faster than the pure-Python one behind yaml.safe_dump.
+_dump_yaml = partial(yaml.dump, Dumper=_SafeDumper, sort_keys=False, allow_unicode=True)
+
 alias_reverse: dict[str, str] | None = None
 
+# Payload between the first <|im_middle|> and the following <|im_end|>, found in one scan.
+_TOOL_DECLARE_RE = re.compile(r"<\|im_middle\|>(.*?)<\|im_end\|>", re.DOTALL)
+# Outermost [...] span inside the unescaped payload.
+_TOOL_LIST_RE = re.compile(r"\[.*\]", re.DOTALL)
+
 
 def set_alias_map(path: Path | None):
     global alias_reverse
@@ -41,18 +57,15 @@ def show_name(name: str | None) -> str:
 
 
 def parse_tool_declare(content: str) -> str:
-    start_mid = content.find("<|im_middle|>")
-    end_tag = "<|im_end|>"
-    end_idx = content.find(end_tag, start_mid)
-    if start_mid == -1 or end_idx == -1:
+    match = _TOOL_DECLARE_RE.search(content)
+    if not match:
         return content.strip()
-    raw = content[start_mid + len("<|im_middle|>") : end_idx].strip()
-    raw_unescaped = bytes(raw, "utf-8").decode("unicode_escape")
-    start_list = raw_unescaped.find("[")
-    end_list = raw_unescaped.rfind("]")
-    if start_list == -1 or end_list == -1:
+    raw = match.group(1).strip()
+    raw_unescaped = raw.encode("utf-8").decode("unicode_escape")
+    list_match = _TOOL_LIST_RE.search(raw_unescaped)
+    if not list_match:
         return raw_unescaped.strip()
-    payload = raw_unescaped[start_list : end_list + 1]
+    payload = list_match.group(0)
     try:
         data = json.loads(payload)
     except json.JSONDecodeError:
@@ -61,7 +74,7 @@ def parse_tool_declare(content: str) -> str:
             data = json.loads(fixed[fixed.find("[") : fixed.rfind("]") + 1])
         except json.JSONDecodeError:
             return raw_unescaped.strip()
-    yaml_text = yaml.safe_dump(data, sort_keys=False, allow_unicode=True)
+    yaml_text = _dump_yaml(data)
     return yaml_text.strip()
 
 
@@ -73,9 +86,9 @@ def dump_json_like(value):
             parsed = json.loads(value)
         except json.JSONDecodeError:
             return value.strip()
-        return yaml.safe_dump(parsed, sort_keys=False, allow_unicode=True).strip()
+        return _dump_yaml(parsed).strip()
     elif isinstance(value, (dict, list)):
-        return yaml.safe_dump(value, sort_keys=False, allow_unicode=True).strip()
+        return _dump_yaml(value).strip()
     return str(value)
 
 
@@ -157,7 +170,7 @@ def pretty_print_record(record: dict, index: int) -> str:
         lines.append("Metadata:")
         try:
             metadata_obj = json.loads(metadata_raw) if isinstance(metadata_raw, str) else metadata_raw
-            meta_yaml = yaml.safe_dump(metadata_obj, sort_keys=False, allow_unicode=True).strip()
+            meta_yaml = _dump_yaml(metadata_obj).strip()
             lines.append(indent(meta_yaml, '  '))
         except Exception:
             lines.append(indent(str(metadata_raw), '  '))
@@ -193,15 +206,15 @@ def main():
     if not path.exists():
         raise FileNotFoundError(f"{path} not found")
 
-    with path.open() as f:
+    write = sys.stdout.write
+    with path.open("rb") as f:
         for idx, line in enumerate(f, 1):
-            line = line.strip()
-            if not line:
+            # json.loads takes bytes and ignores the trailing newline, so no strip copy is needed.
+            if line.isspace():
                 continue
             record = json.loads(line)
-            text = pretty_print_record(record, idx)
-            print(text)
-            print()
+            # One write per record (text plus blank separator line) instead of two print calls.
+            write(f"{pretty_print_record(record, idx)}\n\n")
             if args.num_records is not None and idx >= args.num_records:
                 break
 
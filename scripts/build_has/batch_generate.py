@@ -5,12 +5,30 @@ from __future__ import annotations
 
 import argparse
 import json
+import os
 import shutil
-import subprocess
 import sys
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from dataclasses import dataclass
+from itertools import chain
 from pathlib import Path
+from typing import Iterable, Iterator
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+SCRIPTS_ROOT = SCRIPT_DIR.parent
+if str(SCRIPTS_ROOT) not in sys.path:
+    sys.path.append(str(SCRIPTS_ROOT))
+
+from analysis.pretty_toucan import pretty_print_record
+from build_has.build_has_api_script import generate_sequential, load_build_context
+from utils.has_utils import (
+    READ_BUFFER_BYTES,
+    WRITE_BUFFER_BYTES,
+    find_jsonl_files,
+    load_meta,
+    parse_jsonl_lines,
+)
+from utils.worker_state import get_state, init_worker, preload_state
 
 
 BASE_DIR = Path(__file__).resolve().parents[2]
@@ -61,13 +79,13 @@ def parse_args() -> argparse.Namespace:
         "--seed",
         type=int,
         default=42,
-        help="Random seed forwarded to build_has_api_script.py.",
+        help="Random seed for HAS-API option sampling (one RNG per mode).",
     )
     parser.add_argument(
         "--workers",
         type=int,
-        default=4,
-        help="Number of parallel workers.",
+        default=None,
+        help="Number of parallel workers (default: CPU count; capped by CPU count and number of files).",
     )
     parser.add_argument(
         "--max-files",
@@ -79,7 +97,7 @@ def parse_args() -> argparse.Namespace:
         "--max-samples",
         type=int,
         default=None,
-        help="Forwarded to build_has_api_script.py to cap HAS-API outputs per file.",
+        help="Cap HAS-API outputs per file and mode.",
     )
     parser.add_argument(
         "--param-pool",
@@ -121,6 +139,29 @@ def parse_args() -> argparse.Namespace:
         default=512,
         help="Forwarded to build_has_api_prompt.py --max-tokens (default: 512).",
     )
+    parser.add_argument(
+        "--prompt-concurrency",
+        type=int,
+        default=None,
+        help="Forwarded to build_has_api_prompt.py --concurrency (default: its own default).",
+    )
+    parser.add_argument(
+        "--prompt-batch-size",
+        type=int,
+        default=None,
+        help="Forwarded to build_has_api_prompt.py --batch-size (default: no batching).",
+    )
+    parser.add_argument(
+        "--prompt-dedup",
+        action="store_true",
+        help="Forwarded to build_has_api_prompt.py --dedup (reuse results for repeated calls; default: off).",
+    )
+    parser.add_argument(
+        "--prompt-rate-limit",
+        type=float,
+        default=None,
+        help="Forwarded to build_has_api_prompt.py --rate-limit (requests per second; default: unlimited).",
+    )
     parser.add_argument(
         "--prompt-model",
         type=str,
@@ -146,8 +187,6 @@ def parse_args() -> argparse.Namespace:
 class JobConfig:
     output_dir: Path
     stats_path: Path
-    pretty_script: Path
-    has_script: Path
     modes: list[str]
     negatives: int
     seed: int
@@ -156,26 +195,24 @@ class JobConfig:
     pretty_records: int
     prompt_mode: bool
     param_pool: Path | None
-    prompt_script: Path
     prompt_limit: int | None
     prompt_temperature: float
     prompt_max_tokens: int
+    prompt_concurrency: int | None
+    prompt_rate_limit: float | None
+    prompt_dedup: bool
+    prompt_batch_size: int | None
     prompt_model: str | None
     prompt_base_url: str | None
     prompt_api_key: str | None
 
 
-def run_command(cmd: list[str], log_prefix: str, stdout=None) -> None:
-    cmd_str = " ".join(cmd)
-    print(f"[{log_prefix}] RUN {cmd_str}")
-    subprocess.run(cmd, check=True, stdout=stdout)
-
-
 def run_prompt_generation(jsonl_path: Path, cfg: JobConfig, dest_dir: Path, log_prefix: str) -> None:
+    # Imported lazily: build_has_api_prompt requires the openai package, which only prompt mode needs.
+    from build_has import build_has_api_prompt
+
     output_path = dest_dir / f"{jsonl_path.stem}_api_param_values_prompt.jsonl"
-    cmd = [
-        sys.executable,
-        str(cfg.prompt_script),
+    argv = [
         "-i",
         str(jsonl_path),
         "-s",
@@ -184,18 +221,83 @@ def run_prompt_generation(jsonl_path: Path, cfg: JobConfig, dest_dir: Path, log_
         str(output_path),
     ]
     if cfg.prompt_limit is not None:
-        cmd.extend(["--limit", str(cfg.prompt_limit)])
+        argv.extend(["--limit", str(cfg.prompt_limit)])
     if cfg.prompt_temperature is not None:
-        cmd.extend(["--temperature", str(cfg.prompt_temperature)])
+        argv.extend(["--temperature", str(cfg.prompt_temperature)])
     if cfg.prompt_max_tokens is not None:
-        cmd.extend(["--max-tokens", str(cfg.prompt_max_tokens)])
+        argv.extend(["--max-tokens", str(cfg.prompt_max_tokens)])
+    if cfg.prompt_concurrency is not None:
+        argv.extend(["--concurrency", str(cfg.prompt_concurrency)])
+    if cfg.prompt_batch_size is not None:
+        argv.extend(["--batch-size", str(cfg.prompt_batch_size)])
+    if cfg.prompt_rate_limit is not None:
+        argv.extend(["--rate-limit", str(cfg.prompt_rate_limit)])
+    if cfg.prompt_dedup:
+        argv.append("--dedup")
     if cfg.prompt_model:
-        cmd.extend(["--model", cfg.prompt_model])
+        argv.extend(["--model", cfg.prompt_model])
     if cfg.prompt_base_url:
-        cmd.extend(["--base-url", cfg.prompt_base_url])
+        argv.extend(["--base-url", cfg.prompt_base_url])
     if cfg.prompt_api_key:
-        cmd.extend(["--api-key", cfg.prompt_api_key])
-    run_command(cmd, log_prefix)
+        argv.extend(["--api-key", cfg.prompt_api_key])
+    print(f"[{log_prefix}] PROMPT -> {output_path}")
+    build_has_api_prompt.run(build_has_api_prompt.parse_args(argv), meta=get_state())
+
+
+def _context_pool(cfg: JobConfig, modes: list[str]) -> Path | None:
+    return cfg.param_pool if "param_values" in modes else None
+
+
+def _load_shared_state(cfg: JobConfig):
+    """Return the function meta in prompt mode, otherwise the build context for cfg.modes (None without modes)."""
+    if cfg.prompt_mode:
+        return load_meta(cfg.stats_path)
+    if not cfg.modes:
+        return None
+    return load_build_context(cfg.stats_path, cfg.negatives, _context_pool(cfg, cfg.modes))
+
+
+def _pretty_head(lines: Iterable[bytes], pretty_path: Path, limit: int) -> Iterator[dict]:
+    """Pretty-print and yield the records on the first limit lines (every line when limit < 0).
+
+    Records are numbered by file line, as pretty_toucan.py numbers them.
+    """
+    with pretty_path.open("w", encoding="utf-8", buffering=WRITE_BUFFER_BYTES) as pretty_f:
+        for idx, line in enumerate(lines, 1):
+            for record in parse_jsonl_lines((line,)):
+                pretty_f.write(f"{pretty_print_record(record, idx)}\n\n")
+                yield record
+            if idx == limit:
+                break
+
+
+def generate_in_process(jsonl_path: Path, cfg: JobConfig, dest_dir: Path, modes: list[str]) -> None:
+    """Parse jsonl_path once and feed each record to the pretty printer and every HAS-API mode."""
+    if not modes and cfg.pretty_records == 0:
+        return
+    ctx = get_state()
+    if modes and ctx is None:
+        ctx = load_build_context(cfg.stats_path, cfg.negatives, _context_pool(cfg, modes))
+    produced = {mode: 0 for mode in modes}
+    sinks = {}
+    try:
+        for mode in modes:
+            sink_path = dest_dir / f"{jsonl_path.stem}_api_{mode}.jsonl"
+            sinks[mode] = sink_path.open("w", encoding="utf-8", buffering=WRITE_BUFFER_BYTES)
+        with jsonl_path.open("rb", buffering=READ_BUFFER_BYTES) as fh:
+            head = iter(())
+            if cfg.pretty_records != 0:
+                head = _pretty_head(fh, dest_dir / f"{jsonl_path.stem}.txt", cfg.pretty_records)
+            if modes:
+                generate_sequential(
+                    chain(head, parse_jsonl_lines(fh)), modes, ctx, cfg.seed, sinks, produced, cfg.max_samples
+                )
+            # Finish the pretty output even when every mode stopped early at --max-samples.
+            for _ in head:
+                pass
+    finally:
+        for sink in sinks.values():
+            sink.close()
 
 
 def process_file(jsonl_path: Path, rel_path: Path, cfg: JobConfig) -> tuple[str, bool, str | None]:
@@ -208,45 +310,12 @@ def process_file(jsonl_path: Path, rel_path: Path, cfg: JobConfig) -> tuple[str,
             dest_jsonl = dest_dir / jsonl_path.name
             shutil.copy2(jsonl_path, dest_jsonl)
 
-        if cfg.pretty_records != 0:
-            pretty_output = dest_dir / f"{jsonl_path.stem}.txt"
-            cmd = [sys.executable, str(cfg.pretty_script), "-i", str(jsonl_path)]
-            if cfg.pretty_records > 0:
-                cmd.extend(["-n", str(cfg.pretty_records)])
-            with pretty_output.open("w", encoding="utf-8") as pretty_f:
-                run_command(cmd, log_prefix, stdout=pretty_f)
-
+        generate_in_process(jsonl_path, cfg, dest_dir, [] if cfg.prompt_mode else cfg.modes)
         if cfg.prompt_mode:
             run_prompt_generation(jsonl_path, cfg, dest_dir, log_prefix)
-        else:
-            for mode in cfg.modes:
-                api_output = dest_dir / f"{jsonl_path.stem}_api_{mode}.jsonl"
-                cmd = [
-                    sys.executable,
-                    str(cfg.has_script),
-                    "-i",
-                    str(jsonl_path),
-                    "-s",
-                    str(cfg.stats_path),
-                    "-o",
-                    str(api_output),
-                    "--mode",
-                    mode,
-                    "--negatives",
-                    str(cfg.negatives),
-                    "--seed",
-                    str(cfg.seed),
-                ]
-                if mode == "param_values" and cfg.param_pool:
-                    cmd.extend(["--param-pool", str(cfg.param_pool)])
-                if cfg.max_samples:
-                    cmd.extend(["--max-samples", str(cfg.max_samples)])
-                run_command(cmd, log_prefix)
 
         return (log_prefix, True, None)
-    except subprocess.CalledProcessError as exc:
-        return (log_prefix, False, f"Command failed: {exc}")
-    except Exception as exc:
+    except (Exception, SystemExit) as exc:
         return (log_prefix, False, str(exc))
 
 
@@ -264,7 +333,7 @@ def main() -> None:
                 "Run scripts/data_preprocess/build_param_pool.py first or pass --param-pool."
             )
 
-    jsonl_files = sorted(args.input_dir.rglob("*.jsonl"))
+    jsonl_files = find_jsonl_files(args.input_dir)
     if not jsonl_files:
         print(f"[WARN] No jsonl files found under {args.input_dir}")
         return
@@ -272,15 +341,17 @@ def main() -> None:
         jsonl_files = jsonl_files[: args.max_files]
 
     if args.prompt_mode:
-        if args.workers != 1:
+        if args.workers not in (None, 1):
             print("[WARN] prompt-mode 强制串行执行，忽略 --workers 设置。")
         args.workers = 1
+    # Each worker preloads meta in its initializer, so never start more workers than there are files;
+    # workers beyond the core count only add context switches to this CPU-bound work.
+    cpu_count = os.cpu_count() or 4
+    args.workers = max(1, min(args.workers or cpu_count, cpu_count, len(jsonl_files)))
 
     cfg = JobConfig(
         output_dir=args.output_dir,
         stats_path=args.stats,
-        pretty_script=BASE_DIR / "scripts" / "analysis" / "pretty_toucan.py",
-        has_script=BASE_DIR / "scripts" / "build_has" / "build_has_api_script.py",
         modes=args.modes,
         negatives=args.negatives,
         seed=args.seed,
@@ -289,10 +360,13 @@ def main() -> None:
         pretty_records=args.pretty_records,
         prompt_mode=args.prompt_mode,
         param_pool=args.param_pool if not args.prompt_mode else None,
-        prompt_script=BASE_DIR / "scripts" / "build_has" / "build_has_api_prompt.py",
         prompt_limit=args.prompt_limit,
         prompt_temperature=args.prompt_temperature,
         prompt_max_tokens=args.prompt_max_tokens,
+        prompt_concurrency=args.prompt_concurrency,
+        prompt_rate_limit=args.prompt_rate_limit,
+        prompt_dedup=args.prompt_dedup,
+        prompt_batch_size=args.prompt_batch_size,
         prompt_model=args.prompt_model,
         prompt_base_url=args.prompt_base_url,
         prompt_api_key=args.prompt_api_key,
@@ -303,14 +377,18 @@ def main() -> None:
     print(f"[INFO] Found {len(jsonl_files)} jsonl files. Launching {args.workers} workers.")
 
     tasks = []
-    for file_path in jsonl_files:
+    # Largest files first (LPT scheduling) so a big shard does not start last and stretch the tail.
+    for file_path in sorted(jsonl_files, key=lambda p: p.stat().st_size, reverse=True):
         rel_path = file_path.relative_to(args.input_dir)
         tasks.append((file_path, rel_path))
 
     success = 0
     failures: list[tuple[str, str]] = []
 
-    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+    preload_state(_load_shared_state, cfg)
+    with ProcessPoolExecutor(
+        max_workers=args.workers, initializer=init_worker, initargs=(_load_shared_state, cfg)
+    ) as executor:
         future_to_task = {
             executor.submit(process_file, file_path, rel_path, cfg): rel_path.as_posix()
             for file_path, rel_path in tasks
@@ -10,12 +10,14 @@ from Toucan conversation logs. Each output line mirrors
 from __future__ import annotations
 
 import argparse
+import asyncio
+import hashlib
 import importlib
 import json
 import re
 import sys
 import time
-from collections import defaultdict
+from collections import defaultdict, deque
 from dataclasses import dataclass
 from pathlib import Path
 from typing import Iterable
@@ -30,10 +32,19 @@ try:
 except ImportError as exc:  # pragma: no cover - dependency guard
     raise SystemExit("Please install the 'openai' package: pip install openai") from exc
 
-OpenAI = _openai.OpenAI
+AsyncOpenAI = _openai.AsyncOpenAI
 OpenAIError = _openai.OpenAIError
 
+# httpx 是 openai 的依赖；HTTP/2 需要额外安装 h2（pip install 'httpx[http2]'），缺失时退回 HTTP/1.1 keep-alive。
+httpx = importlib.import_module("httpx")
+try:
+    importlib.import_module("h2")
+    HTTP2_AVAILABLE = True
+except ImportError:  # pragma: no cover - optional speedup
+    HTTP2_AVAILABLE = False
+
 from utils.has_utils import (
+    WRITE_BUFFER_BYTES,
     format_arg_values,
     iter_function_calls,
     load_jsonl,
@@ -51,6 +62,16 @@ SYSTEM_PROMPT = """You write multiple-choice questions that verify whether a too
 used the correct parameter values. Always respond with valid JSON.
 """
 
+# 括号匹配扫描只需停在这几个字符上，其余字符由正则在 C 层跳过。
+_JSON_SCAN_RE = re.compile(r'[{}"\\]')
+_JSON_DECODER = json.JSONDecoder()
+
+# 提示词中的 JSON 不缩进：indent=2 会让参数/schema 的 token 数翻倍。
+_COMPACT_SEPARATORS = (",", ":")
+
+# summarize_schema 结果缓存，key 为 (function_name, limit)；同一函数的 schema 在一次运行中不变。
+_SCHEMA_SUMMARY_CACHE: dict[tuple[str, int], str] = {}
+
 
 def calc_sign(data, sign_key, query_param, path, method, app_id) -> tuple[int, str]:
     """为 data 构造签名字符串，预留鉴权逻辑（当前返回空签名）。"""
@@ -60,6 +81,11 @@ def calc_sign(data, sign_key, query_param, path, method, app_id) -> tuple[int, s
     return timestamp, sign
 
 
+def warn(message: str) -> None:
+    """写一条日志到 stderr：预先格式化、单次 write，代替 print(..., file=sys.stderr)。"""
+    sys.stderr.write(message + "\n")
+
+
 @dataclass
 class GenerationTask:
     function_name: str
@@ -114,16 +140,14 @@ class FailureTracker:
     def report(self) -> None:
         if not self.stats:
             return
-        print("[WARN] Failure summary:", file=sys.stderr)
+        lines = ["[WARN] Failure summary:"]
         for reason, count in self.stats.items():
-            print(f"  - {reason}: {count}", file=sys.stderr)
+            lines.append(f"  - {reason}: {count}")
             for sample in self.samples[reason]:
                 fn = sample["function_name"]
                 detail = sample.get("detail") or ""
-                print(
-                    f"      sample -> {fn} @idx={sample['message_index']} detail={detail}",
-                    file=sys.stderr,
-                )
+                lines.append(f"      sample -> {fn} @idx={sample['message_index']} detail={detail}")
+        warn("\n".join(lines))
 
 
 def truncate_text(text: str, limit: int) -> str:
@@ -134,11 +158,34 @@ def truncate_text(text: str, limit: int) -> str:
     return text[: head if head > 0 else 0] + "..."
 
 
+def compact_json_prefix(value, limit: int) -> str:
+    """紧凑序列化 value；顶层为 dict 时逐个 key 拼接，长度超过 limit 即停止，不必生成完整 JSON。
+
+    返回值是完整序列化结果的前缀（至少 limit+1 个字符或全文），再交给 truncate_text 即可，结果与整体 dumps 后截断一致。
+    """
+    if limit <= 0 or not isinstance(value, dict):
+        return json.dumps(value, ensure_ascii=False, separators=_COMPACT_SEPARATORS)
+    parts = ["{"]
+    total = 1
+    for key, item in value.items():
+        part = "" if total == 1 else ","
+        part += json.dumps(str(key), ensure_ascii=False) + ":"
+        part += json.dumps(item, ensure_ascii=False, separators=_COMPACT_SEPARATORS)
+        parts.append(part)
+        total += len(part)
+        if total > limit:
+            return "".join(parts)
+    parts.append("}")
+    return "".join(parts)
+
+
 def summarize_schema(schema: dict, limit: int) -> str:
     """将函数参数 schema 概括成简洁的多行字符串，并截断长度。"""
     props = (schema or {}).get("properties") or {}
     required = set((schema or {}).get("required") or [])
     lines: list[str] = []
+    # 累计 "\n".join(lines) 的长度，避免每轮重新拼接（原来是 O(n²)）。
+    joined_len = -1
     for name, prop in props.items():
         type_info = prop.get("type") if isinstance(prop, dict) else None
         desc = prop.get("description") if isinstance(prop, dict) else None
@@ -152,31 +199,41 @@ def summarize_schema(schema: dict, limit: int) -> str:
             if clean_desc:
                 line += f": {clean_desc}"
         lines.append(line)
-        summary = "\n".join(lines)
-        if len(summary) > limit:
+        joined_len += len(line) + 1
+        if joined_len > limit:
             break
-    if not lines:
-        summary = json.dumps(schema, ensure_ascii=False, indent=2)
+    if lines:
+        summary = "\n".join(lines)
+    else:
+        summary = compact_json_prefix(schema, limit)
     return truncate_text(summary, limit)
 
 
+def cached_schema_summary(function_name: str, schema: dict, limit: int) -> str:
+    """按 (函数名, 长度上限) 缓存 summarize_schema，避免同一函数的每次调用都重新拼接。"""
+    key = (function_name, limit)
+    summary = _SCHEMA_SUMMARY_CACHE.get(key)
+    if summary is None:
+        summary = _SCHEMA_SUMMARY_CACHE[key] = summarize_schema(schema, limit)
+    return summary
+
+
 def normalize_option_text(option: str) -> str:
     """规范化 options 字符串，便于与 canonical 做宽松对比。"""
     if not isinstance(option, str):
         return ""
-    text = option.strip()
-    text = " ".join(text.split())
-    text = re.sub(r"\s*=\s*", "=", text)
-    text = re.sub(r"\s*;\s*", "; ", text)
-    return text
+    # split/join 后空白只剩单个空格，用 str.replace 代替两次 re.sub：= 两侧去空格，; 统一为 "; "。
+    text = " ".join(option.split())
+    text = text.replace(" =", "=").replace("= ", "=")
+    return text.replace(" ;", ";").replace("; ", ";").replace(";", "; ")
 
 
-def list_available_models(client: OpenAI) -> list[str]:
+async def list_available_models(client: AsyncOpenAI) -> list[str]:
     """调用 /v1/models 列出当前可用的模型 id，用于 404 回退。"""
     try:
-        resp = client.models.list()
+        resp = await client.models.list()
     except Exception as exc:  # pragma: no cover - defensive logging
-        print(f"[WARN] Failed to list models from endpoint: {exc}", file=sys.stderr)
+        warn(f"[WARN] Failed to list models from endpoint: {exc}")
         return []
     models = getattr(resp, "data", []) or []
     names: list[str] = []
@@ -221,9 +278,8 @@ def toucan_tasks(input_path: Path, meta: dict[str, dict], limit: int | None) ->
 
 def build_prompt(task: GenerationTask, limits: PromptLimits) -> str:
     """根据任务信息构建提示词，包含 schema/参数/上下文摘要。"""
-    # 为啥要有两个build_prompt函数
-    schema_text = summarize_schema(task.schema, limits.schema_chars)
-    args_text = truncate_text(json.dumps(task.arguments, ensure_ascii=False, indent=2), limits.args_chars)
+    schema_text = cached_schema_summary(task.function_name, task.schema, limits.schema_chars)
+    args_text = truncate_text(json.dumps(task.arguments, ensure_ascii=False, separators=_COMPACT_SEPARATORS), limits.args_chars)
     canonical = format_arg_values(task.arguments)
     context = truncate_text(task.context.strip() or "Conversation context omitted.", limits.context_chars)
     return (
@@ -242,21 +298,110 @@ def build_prompt(task: GenerationTask, limits: PromptLimits) -> str:
     )
 
 
+def build_batch_prompt(tasks: list[GenerationTask], limits: PromptLimits) -> str:
+    """同一函数的多个任务合并成一个提示词：schema 只出现一次，要求按任务顺序返回 JSON 数组。"""
+    first = tasks[0]
+    schema_text = cached_schema_summary(first.function_name, first.schema, limits.schema_chars)
+    parts = [
+        "Goal: create HAS-API multiple-choice questions that check whether the agent\n"
+        "used the correct parameters when calling a tool.\n\n"
+        f"Function name: {first.function_name}\n"
+        f"Function schema (JSON):\n{schema_text}\n"
+    ]
+    for idx, task in enumerate(tasks, 1):
+        args_text = truncate_text(
+            json.dumps(task.arguments, ensure_ascii=False, separators=_COMPACT_SEPARATORS), limits.args_chars
+        )
+        context = truncate_text(task.context.strip() or "Conversation context omitted.", limits.context_chars)
+        parts.append(
+            f"Task {idx}:\n"
+            f"Context snippet: {context}\n"
+            f"Correct arguments JSON:\n{args_text}\n"
+            f"Canonical correct option string:\n{format_arg_values(task.arguments)}\n"
+        )
+    parts.append(
+        f"Output a JSON array with exactly {len(tasks)} objects, one per task and in task order.\n"
+        "Each object has exactly three keys: question (string), options (array of 4-5 short\n"
+        "strings), and answer (string). Include the task's canonical string verbatim as one of\n"
+        "the options and set answer to the same string. For distractors, change one or two\n"
+        "parameter values while keeping the same format (key=value; key2=value2 ...).\n"
+        "Respond with the JSON array only."
+    )
+    return "\n".join(parts)
+
+
+def extract_json_array(text: str) -> list | None:
+    """从批量请求的输出中取出第一个 JSON 数组（可在 ``` 围栏内）；解析失败返回 None。"""
+    text = text.strip()
+    fence = text.find("```")
+    start = text.find("[", fence + 3) if fence != -1 else -1
+    if start == -1:
+        start = text.find("[")
+    if start == -1:
+        return None
+    try:
+        items, _ = _JSON_DECODER.raw_decode(text, start)
+    except ValueError:
+        return None
+    return items if isinstance(items, list) else None
+
+
 def extract_json_block(text: str) -> str | None:
     """从模型输出中提取 JSON 代码块，容忍未标注语言或裸花括号。"""
     text = text.strip()
     if not text:
         return None
-    code_block = re.search(r"```(?:json)?\s*(\{.*?\})\s*```", text, re.DOTALL)
-    if code_block:
-        return code_block.group(1)
-    brace_match = re.search(r"\{.*\}", text, re.DOTALL)
-    if brace_match:
-        return brace_match.group(0)
-    return None
-
-
-def call_llm(client: OpenAI, model: str, prompt: str, temperature: float, max_tokens: int, url="", data="") -> str:
+    # 有 ``` 围栏时从围栏之后找第一个 {，否则从开头找。
+    fence = text.find("```")
+    start = text.find("{", fence + 3) if fence != -1 else -1
+    if start == -1:
+        start = text.find("{")
+    if start == -1:
+        return None
+    # 合法 JSON 直接由 C 扫描器定位对象结尾；不合法时再用括号匹配兜底。
+    try:
+        _, stop = _JSON_DECODER.raw_decode(text, start)
+        return text[start:stop]
+    except ValueError:
+        pass
+    end = _matching_brace(text, start)
+    if end == -1:
+        # 括号不配对（输出被截断等）：退回到最后一个 }，交给 json.loads 报错。
+        end = text.rfind("}")
+        if end <= start:
+            return None
+    return text[start : end + 1]
+
+
+def _matching_brace(text: str, start: int) -> int:
+    """返回与 text[start] 处 { 配对的 } 下标，跳过字符串内的括号与转义；找不到返回 -1。"""
+    depth = 0
+    in_string = False
+    search = _JSON_SCAN_RE.search
+    pos = start
+    while True:
+        match = search(text, pos)
+        if match is None:
+            return -1
+        idx = match.start()
+        char = text[idx]
+        pos = idx + 1
+        if in_string:
+            if char == "\\":
+                pos += 1
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char == "{":
+            depth += 1
+        elif char == "}":
+            depth -= 1
+            if depth == 0:
+                return idx
+
+
+async def call_llm(client: AsyncOpenAI, model: str, prompt: str, temperature: float, max_tokens: int, url="", data="") -> str:
     if url:
         calc_sign()
         return
@@ -266,7 +411,7 @@ def call_llm(client: OpenAI, model: str, prompt: str, temperature: float, max_to
     # 构造请求头
     # 发送请求并获得响应
     # 处理响应数据
-    resp = client.chat.completions.create(
+    resp = await client.chat.completions.create(
         model=model,
         messages=[
             {"role": "system", "content": SYSTEM_PROMPT},
@@ -309,11 +454,10 @@ def write_entry(sink, task: GenerationTask, payload: dict) -> None:
         "record_uuid": task.record_uuid,
         "message_index": task.message_index,
     }
-    json.dump(entry, sink, ensure_ascii=False)
-    sink.write("\n")
+    sink.write(json.dumps(entry, ensure_ascii=False) + "\n")
 
 
-def parse_args() -> argparse.Namespace:
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
     """解析命令行参数，统一入口，方便在其它数据集复用。"""
     parser = argparse.ArgumentParser(description="Prompt-based HAS param_values generator for Toucan data.")
     parser.add_argument("-o", "--output", type=Path, required=True, help="Output jsonl path.")
@@ -323,7 +467,37 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument("--temperature", type=float, default=0.4, help="LLM sampling temperature.")
     parser.add_argument("--max-tokens", type=int, default=512, help="Max tokens for completion.")
     parser.add_argument("--retries", type=int, default=3, help="Retries per sample on bad outputs.")
-    parser.add_argument("--sleep", type=float, default=0.5, help="Seconds to sleep between calls.")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Per-request timeout in seconds.")
+    parser.add_argument("--sleep", type=float, default=0.5, help="Upper bound (seconds) on backoff after LLM call errors.")
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=1,
+        help="Pack up to N tasks of the same function into one LLM request (default: 1, no batching).",
+    )
+    parser.add_argument(
+        "--dedup",
+        action="store_true",
+        help="Reuse one LLM result for calls with the same function name and arguments (default: off).",
+    )
+    parser.add_argument(
+        "--dedup-cache",
+        type=int,
+        default=10000,
+        help="With --dedup, remember at most N distinct calls; the oldest are forgotten first (default: 10000).",
+    )
+    parser.add_argument(
+        "--rate-limit",
+        type=float,
+        default=0.0,
+        help="Maximum LLM requests per second across all in-flight tasks (default: 0, unlimited).",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=8,
+        help="Maximum LLM requests in flight; results are still written in input order (default: 8).",
+    )
     parser.add_argument("--base-url", default=DEFAULT_BASE_URL, help="OpenAI-compatible endpoint.")
     parser.add_argument("--model", default=DEFAULT_MODEL, help="Model name/path served by vLLM.")
     parser.add_argument("--api-key", default="EMPTY", help="API key for the endpoint.")
@@ -345,18 +519,298 @@ def parse_args() -> argparse.Namespace:
         default=400,
         help="Truncate canonical arguments JSON to at most N characters (default: 400).",
     )
-    return parser.parse_args()
+    return parser.parse_args(argv)
 
 
-def main() -> None:
-    """主流程：加载配置、遍历任务、调用 LLM 生成并写入 jsonl。"""
-    args = parse_args()
-    client = OpenAI(base_url=args.base_url, api_key=args.api_key)
+class TokenBucket:
+    """令牌桶限速：rate 为每秒请求数，允许 burst 个突发；rate<=0 时不限速，空闲时不等待。"""
+
+    def __init__(self, rate: float, burst: int = 1) -> None:
+        self.rate = rate
+        self.capacity = float(max(burst, 1))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    async def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+async def retry_backoff(attempt: int, cap: float) -> None:
+    """失败重试前的指数退避：0.2s、0.4s、0.8s…，不超过 cap 秒。"""
+    await asyncio.sleep(min(2**attempt * 0.1, cap))
+
+
+@dataclass
+class RunState:
+    """跨任务共享的可变状态：404 回退后所有后续请求改用新模型。"""
+
+    model: str
+
+
+async def generate_payload(
+    client: AsyncOpenAI,
+    task: GenerationTask,
+    args: argparse.Namespace,
+    base_limits: PromptLimits,
+    state: RunState,
+    failure_tracker: FailureTracker,
+    limiter: TokenBucket,
+) -> dict | None:
+    """对单个任务按重试次数调用 LLM，返回通过校验的 payload；重试耗尽返回 None。"""
+    limits = base_limits.copy()
+    canonical = format_arg_values(task.arguments)
+    result = None
+    for attempt in range(1, args.retries + 1):
+        prompt = build_prompt(task, limits)
+        await limiter.acquire()
+        try:
+            content = await call_llm(client, state.model, prompt, args.temperature, args.max_tokens)
+        except OpenAIError as exc:
+            err_text = getattr(exc, "message", str(exc))
+            warn(f"[WARN] LLM call failed (attempt {attempt}): {err_text}")
+            lowered = (err_text or "").lower()
+            status_code = getattr(exc, "status_code", None)
+            if (
+                status_code == 404
+                or "model" in lowered and "does not exist" in lowered
+                or "not found" in lowered
+            ):
+                available = await list_available_models(client)
+                if available:
+                    if state.model not in available:
+                        fallback = available[0]
+                        warn(
+                            f"[WARN] Model '{state.model}' unavailable. "
+                            f"Falling back to '{fallback}'. Available models: {available}"
+                        )
+                        state.model = fallback
+                    else:
+                        warn(f"[WARN] Requested model '{state.model}' exists but endpoint still returned 404.")
+                else:
+                    warn(
+                        "[WARN] Unable to fetch available models; please ensure the vLLM server exposes the "
+                        "desired `--served-model-name`."
+                    )
+                failure_tracker.record("model_not_found", task, err_text)
+                await retry_backoff(attempt, args.sleep)
+                continue
+            if "maximum context length" in lowered or "context length" in lowered:
+                limits = limits.shrink()
+                warn(
+                    f"[WARN] Prompt truncated further to avoid token overflow "
+                    f"(context={limits.context_chars}, schema={limits.schema_chars}, args={limits.args_chars})."
+                )
+                failure_tracker.record("context_length", task, err_text)
+            await retry_backoff(attempt, args.sleep)
+            continue
+        # 以下均为输出内容问题，服务端并无压力，直接重试、不退避。
+        payload_str = extract_json_block(content)
+        if not payload_str:
+            warn(f"[WARN] No JSON detected for {task.function_name} (attempt {attempt}).")
+            failure_tracker.record("no_json", task, content or "")
+            continue
+        try:
+            payload = json.loads(payload_str)
+        except json.JSONDecodeError as exc:
+            warn(f"[WARN] JSON parse error for {task.function_name}: {exc}")
+            failure_tracker.record("json_parse_error", task, payload_str)
+            continue
+        ok, reason = validate_payload(payload, canonical)
+        if not ok:
+            warn(f"[WARN] Invalid payload for {task.function_name} (attempt {attempt}). reason={reason}")
+            failure_tracker.record(reason or "invalid_payload", task, json.dumps(payload, ensure_ascii=False)[:200])
+            continue
+        result = payload
+        break
+    else:
+        warn(f"[ERROR] Exhausted retries for {task.function_name}, skipping.")
+        failure_tracker.record("exhausted_retries", task)
+    return result
+
+
+async def generate_batch(
+    client: AsyncOpenAI,
+    batch: list[tuple[GenerationTask, asyncio.Future]],
+    args: argparse.Namespace,
+    base_limits: PromptLimits,
+    state: RunState,
+    failure_tracker: FailureTracker,
+    limiter: TokenBucket,
+) -> None:
+    """一次请求为同一函数的多个任务出题，结果写回各自的 future；整批失败或单条不合格时逐条回退。"""
+    tasks = [task for task, _ in batch]
+    try:
+        items = None
+        await limiter.acquire()
+        try:
+            content = await call_llm(
+                client,
+                state.model,
+                build_batch_prompt(tasks, base_limits),
+                args.temperature,
+                args.max_tokens * len(tasks),
+            )
+        except OpenAIError as exc:
+            err_text = getattr(exc, "message", str(exc))
+            warn(f"[WARN] Batch LLM call failed for {tasks[0].function_name}: {err_text}")
+            failure_tracker.record("batch_llm_error", tasks[0], err_text)
+        else:
+            items = extract_json_array(content)
+            if items is None or len(items) != len(tasks):
+                warn(f"[WARN] Batch output for {tasks[0].function_name} unusable; falling back to per-task prompts.")
+                failure_tracker.record("batch_mismatch", tasks[0], content or "")
+                items = None
+        fallback = []
+        for idx, (task, future) in enumerate(batch):
+            payload = items[idx] if items is not None else None
+            if payload is not None:
+                ok, reason = validate_payload(payload, format_arg_values(task.arguments))
+                if ok:
+                    future.set_result(payload)
+                    continue
+                failure_tracker.record(reason or "invalid_payload", task, json.dumps(payload, ensure_ascii=False)[:200])
+            fallback.append((task, future))
+        if fallback:
+            results = await asyncio.gather(
+                *(
+                    generate_payload(client, task, args, base_limits, state, failure_tracker, limiter)
+                    for task, _ in fallback
+                )
+            )
+            for (_, future), payload in zip(fallback, results):
+                future.set_result(payload)
+    except asyncio.CancelledError:
+        for _, future in batch:
+            future.cancel()
+        raise
+    except Exception as exc:
+        for _, future in batch:
+            if not future.done():
+                future.set_exception(exc)
+
+
+def task_key(task: GenerationTask) -> tuple[str, bytes]:
+    """(函数名, 参数摘要)：参数按 key 排序序列化后取 blake2b，相同调用得到相同 key。"""
+    args_json = json.dumps(task.arguments, ensure_ascii=False, sort_keys=True)
+    return task.function_name, hashlib.blake2b(args_json.encode("utf-8"), digest_size=16).digest()
+
+
+async def generate_entries(
+    args: argparse.Namespace,
+    tasks_iter: Iterable[GenerationTask],
+    base_limits: PromptLimits,
+    failure_tracker: FailureTracker,
+    sink,
+) -> int:
+    """最多 args.concurrency 个请求并发在途，按任务顺序写出结果，返回写入条数。"""
+    # 连接错误、429、5xx 由 SDK 自带的指数退避重试；这里只处理它放弃之后的错误。
+    # 所有在途请求共用一个连接池，避免每次调用重新握手；client.close() 时一并关闭。
+    http_client = httpx.AsyncClient(
+        http2=HTTP2_AVAILABLE,
+        limits=httpx.Limits(
+            max_connections=max(args.concurrency, 1),
+            max_keepalive_connections=max(args.concurrency, 1),
+        ),
+        timeout=args.timeout,
+    )
+    client = AsyncOpenAI(
+        base_url=args.base_url,
+        api_key=args.api_key,
+        max_retries=args.retries,
+        timeout=args.timeout,
+        http_client=http_client,
+    )
+    state = RunState(model=args.model)
+    limiter = TokenBucket(args.rate_limit, burst=args.concurrency)
+    window: deque[tuple[GenerationTask, asyncio.Future]] = deque()
+    # --dedup 时相同 (函数名, 参数) 的任务共用一次 LLM 结果（含仍在途的请求），各自保留 uuid/message_index；
+    # 最多记住 dedup_cache 个调用，超出时按插入顺序淘汰最早的。
+    seen: dict[tuple[str, bytes], asyncio.Future] = {}
+    dedup_cache = max(args.dedup_cache, 1)
+    produced = 0
+    reused = 0
+    batch_size = max(args.batch_size, 1)
+    # 批量模式下按函数名攒任务，满 batch_size 个（或写出端等到该组）时发出一个请求。
+    groups: dict[str, list[tuple[GenerationTask, asyncio.Future]]] = {}
+    batch_jobs: set[asyncio.Task] = set()
+    window_size = max(args.concurrency, 1) * batch_size
+
+    def launch_group(function_name: str) -> None:
+        coro = generate_batch(client, groups.pop(function_name), args, base_limits, state, failure_tracker, limiter)
+        job = asyncio.create_task(coro)
+        batch_jobs.add(job)
+        job.add_done_callback(batch_jobs.discard)
+
+    def schedule(task: GenerationTask) -> asyncio.Future:
+        if batch_size == 1:
+            coro = generate_payload(client, task, args, base_limits, state, failure_tracker, limiter)
+            return asyncio.create_task(coro)
+        future = asyncio.get_running_loop().create_future()
+        group = groups.setdefault(task.function_name, [])
+        group.append((task, future))
+        if len(group) >= batch_size:
+            launch_group(task.function_name)
+        return future
+
+    async def flush_head() -> None:
+        nonlocal produced
+        task, pending = window.popleft()
+        group = groups.get(task.function_name)
+        if group and any(future is pending for _, future in group):
+            # 该组还没攒满，但写出端已经在等它：立即发出，避免死等。
+            launch_group(task.function_name)
+        payload = await pending
+        if payload is not None:
+            write_entry(sink, task, payload)
+            produced += 1
+
+    try:
+        for task in tasks_iter:
+            key = task_key(task) if args.dedup else None
+            pending = seen.get(key) if key is not None else None
+            if pending is None:
+                pending = schedule(task)
+                if key is not None:
+                    if len(seen) >= dedup_cache:
+                        del seen[next(iter(seen))]
+                    seen[key] = pending
+            else:
+                reused += 1
+            window.append((task, pending))
+            if len(window) >= window_size:
+                await flush_head()
+        while window:
+            await flush_head()
+    finally:
+        for _, pending in window:
+            pending.cancel()
+        for job in list(batch_jobs):
+            job.cancel()
+        await client.close()
+    if reused:
+        print(f"[INFO] Reused LLM results for {reused} duplicate calls.")
+    return produced
+
+
+def run(args: argparse.Namespace, meta: dict[str, dict] | None = None) -> int:
+    """主流程：遍历任务、调用 LLM 生成并写入 jsonl，返回生成条数；meta 可由调用方预先加载复用。"""
     if not args.input.exists():
         raise SystemExit(f"Input file not found: {args.input}")
-    if not args.stats.exists():
-        raise SystemExit(f"Stats file not found: {args.stats}")
-    meta = load_meta(args.stats)
+    if meta is None:
+        if not args.stats.exists():
+            raise SystemExit(f"Stats file not found: {args.stats}")
+        meta = load_meta(args.stats)
+    # 不同 meta 下同名函数的 schema 可能不同，每次运行重新建缓存。
+    _SCHEMA_SUMMARY_CACHE.clear()
 
     tasks_iter = toucan_tasks(args.input, meta, args.limit)
 
@@ -366,120 +820,19 @@ def main() -> None:
         args_chars=args.max_args_chars,
     )
 
-    current_model = args.model
-    produced = 0
     failure_tracker = FailureTracker()
     args.output.parent.mkdir(parents=True, exist_ok=True)
-    with args.output.open("w", encoding="utf-8") as sink:
-        for task in tasks_iter:
-            limits = base_limits.copy()
-            canonical = format_arg_values(task.arguments)
-            success = False
-            for attempt in range(1, args.retries + 1):
-                prompt = build_prompt(task, limits)
-                try:
-                    content = call_llm(client, current_model, prompt, args.temperature, args.max_tokens)
-                except OpenAIError as exc:
-                    err_text = getattr(exc, "message", str(exc))
-                    print(f"[WARN] LLM call failed (attempt {attempt}): {err_text}", file=sys.stderr)
-                    lowered = (err_text or "").lower()
-                    status_code = getattr(exc, "status_code", None)
-                    if (
-                        status_code == 404
-                        or "model" in lowered and "does not exist" in lowered
-                        or "not found" in lowered
-                    ):
-                        available = list_available_models(client)
-                        if available:
-                            if current_model not in available:
-                                fallback = available[0]
-                                print(
-                                    f"[WARN] Model '{current_model}' unavailable. "
-                                    f"Falling back to '{fallback}'. Available models: {available}",
-                                    file=sys.stderr,
-                                )
-                                current_model = fallback
-                            else:
-                                print(
-                                    f"[WARN] Requested model '{current_model}' exists but endpoint still returned 404.",
-                                    file=sys.stderr,
-                                )
-                        else:
-                            print(
-                                "[WARN] Unable to fetch available models; please ensure the vLLM server exposes the "
-                                "desired `--served-model-name`.",
-                                file=sys.stderr,
-                            )
-                        failure_tracker.record("model_not_found", task, err_text)
-                        time.sleep(args.sleep)
-                        continue
-                    if "maximum context length" in lowered or "context length" in lowered:
-                        limits = limits.shrink()
-                        print(
-                            f"[WARN] Prompt truncated further to avoid token overflow "
-                            f"(context={limits.context_chars}, schema={limits.schema_chars}, args={limits.args_chars}).",
-                            file=sys.stderr,
-                        )
-                        failure_tracker.record("context_length", task, err_text)
-                    time.sleep(args.sleep)
-                    continue
-                payload_str = extract_json_block(content)
-                if not payload_str:
-                    print(f"[WARN] No JSON detected for {task.function_name} (attempt {attempt}).", file=sys.stderr)
-                    failure_tracker.record("no_json", task, content or "")
-                    time.sleep(args.sleep)
-                    continue
-                try:
-                    payload = json.loads(payload_str)
-                except json.JSONDecodeError as exc:
-                    print(f"[WARN] JSON parse error for {task.function_name}: {exc}", file=sys.stderr)
-                    failure_tracker.record("json_parse_error", task, payload_str)
-                    time.sleep(args.sleep)
-                    continue
-                ok, reason = validate_payload(payload, canonical)
-                if not ok:
-                    print(
-                        f"[WARN] Invalid payload for {task.function_name} (attempt {attempt}). reason={reason}",
-                        file=sys.stderr,
-                    )
-                    failure_tracker.record(reason or "invalid_payload", task, json.dumps(payload, ensure_ascii=False)[:200])
-                    time.sleep(args.sleep)
-                    continue
-                write_entry(sink, task, payload)
-                produced += 1
-                success = True
-                break
-            if not success:
-                print(f"[ERROR] Exhausted retries for {task.function_name}, skipping.", file=sys.stderr)
-                failure_tracker.record("exhausted_retries", task)
-            if args.limit and produced >= args.limit:
-                break
-            time.sleep(args.sleep)
+    with args.output.open("w", encoding="utf-8", buffering=WRITE_BUFFER_BYTES) as sink:
+        produced = asyncio.run(generate_entries(args, tasks_iter, base_limits, failure_tracker, sink))
 
     print(f"[INFO] Generated {produced} prompt-based entries from Toucan data.")
     failure_tracker.report()
+    return produced
 
 
-if __name__ == "__main__":
-    main()
+def main() -> None:
+    run(parse_args())
 
 
-def build_prompt(task: GenerationTask, limits: PromptLimits) -> str:
-    schema_text = summarize_schema(task.schema, limits.schema_chars)
-    args_text = truncate_text(json.dumps(task.arguments, ensure_ascii=False, indent=2), limits.args_chars)
-    canonical = format_arg_values(task.arguments)
-    context = truncate_text(task.context.strip() or "Conversation context omitted.", limits.context_chars)
-    return (
-        "Goal: create a HAS-API multiple-choice question that checks whether the agent\n"
-        "used the correct parameters when calling a tool.\n\n"
-        f"Function name: {task.function_name}\n"
-        f"Context snippet: {context}\n"
-        f"Function schema (JSON):\n{schema_text}\n\n"
-        f"Correct arguments JSON:\n{args_text}\n\n"
-        "You must output JSON with exactly three keys: question (string), options\n"
-        "(array of 4-5 short strings), and answer (string).\n"
-        f"The canonical correct option string is:\n{canonical}\n"
-        "Include that exact string verbatim as one of the options and set answer to the\n"
-        "same string. For distractors, change one or two parameter values while keeping\n"
-        "the same format (key=value; key2=value2 ...). Respond with JSON only."
-    )
\ No newline at end of file
+if __name__ == "__main__":
+    main()
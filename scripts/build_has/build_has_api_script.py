@@ -13,12 +13,24 @@ Example:
 from __future__ import annotations
 
 import argparse
+import heapq
 import json
+import os
 import random
 import re
 import sys
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from functools import lru_cache
+from itertools import compress, islice
 from pathlib import Path
-from typing import Iterable
+from typing import Iterable, Iterator
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
 
 SCRIPT_DIR = Path(__file__).resolve().parent
 SCRIPTS_ROOT = SCRIPT_DIR.parent
@@ -26,13 +38,16 @@ if str(SCRIPTS_ROOT) not in sys.path:
     sys.path.append(str(SCRIPTS_ROOT))
 
 from utils.has_utils import (
-    format_arg_values,
+    READ_BUFFER_BYTES,
+    WRITE_BUFFER_BYTES,
     infer_param_type,
     iter_function_calls,
     load_jsonl,
     load_meta,
     parse_arguments,
+    parse_jsonl_lines,
 )
+from utils.worker_state import get_state, init_worker, preload_state
 
 
 if hasattr(sys, "set_int_max_str_digits"):
@@ -41,6 +56,20 @@ if hasattr(sys, "set_int_max_str_digits"):
     except Exception:
         pass
 
+# Records per task when --workers > 1: enough to amortise pickling, small enough to keep workers busy.
+CHUNK_RECORDS = 256
+
+
+def _loads_tools(text: str):
+    # Only tool names are read, so orjson's float fallback for huge ints is harmless here;
+    # anything it rejects (e.g. NaN literals) still goes through json.
+    if orjson is not None:
+        try:
+            return orjson.loads(text)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(text)
+
 
 def parse_available_tools(record: dict) -> list[str]:
     tools = record.get("available_tools")
@@ -48,7 +77,7 @@ def parse_available_tools(record: dict) -> list[str]:
         return []
     if isinstance(tools, str):
         try:
-            tools = json.loads(tools)
+            tools = _loads_tools(tools)
         except json.JSONDecodeError:
             return []
     names = []
@@ -59,28 +88,38 @@ def parse_available_tools(record: dict) -> list[str]:
     return names
 
 
+@lru_cache(maxsize=None)
 def _function_family(name: str) -> str:
     """Return a coarse family key based on dashed function name segments."""
     if not name:
         return ""
-    parts = name.split("-")
-    if len(parts) >= 3:
-        return "-".join(parts[:3])
-    if len(parts) == 2:
-        return "-".join(parts)
-    # fall back to underscore grouping
-    under = name.split("_")
-    if len(under) >= 2:
-        return "_".join(under[:2])
+    # Prefix up to the third dash (or the whole name with one or two dashes); str.find avoids
+    # splitting every segment of long names into a throwaway list.
+    dash = name.find("-")
+    if dash != -1:
+        second = name.find("-", dash + 1)
+        third = name.find("-", second + 1) if second != -1 else -1
+        return name[:third] if third != -1 else name
+    # fall back to underscore grouping: prefix up to the second underscore
+    under = name.find("_")
+    if under != -1:
+        second = name.find("_", under + 1)
+        return name[:second] if second != -1 else name
     return name
 
 
-def _tokenize(text: str) -> set[str]:
-    return set(re.findall(r"[a-z0-9]+", text.lower())) if text else set()
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
 
 
-def _build_function_profiles(meta: dict[str, dict]) -> dict[str, dict]:
-    profiles: dict[str, dict] = {}
+def _build_function_profiles(
+    meta: dict[str, dict],
+) -> tuple[dict[str, str], dict[str, int], dict[str, str]]:
+    """Return flat (family_of, bits_of, description_of) lookups, one entry per function name."""
+    family_of: dict[str, str] = {}
+    bits_of: dict[str, int] = {}
+    description_of: dict[str, str] = {}
+    # Every distinct token gets one bit; a function's token set becomes an int bitset.
+    vocab: dict[str, int] = {}
     for name, info in meta.items():
         func_block = info.get("function") or {}
         description = (
@@ -88,62 +127,139 @@ def _build_function_profiles(meta: dict[str, dict]) -> dict[str, dict]:
             or info.get("description")
             or "No description provided."
         )
-        tokens = _tokenize(description) | _tokenize(name.replace("-", " "))
-        profiles[name] = {
-            "family": _function_family(name),
-            "tokens": tokens,
-            "description": description.strip(),
-        }
-    return profiles
+        bits = 0
+        # OR-ing a bit twice is harmless, so tokens go straight into the bitset without a set() per text.
+        for text in (description, name.replace("-", " ")):
+            for token in _TOKEN_RE.findall(text.lower()):
+                bits |= 1 << vocab.setdefault(token, len(vocab))
+        family_of[name] = _function_family(name)
+        bits_of[name] = bits
+        description_of[name] = description.strip()
+    return family_of, bits_of, description_of
+
+
+def _group_families(family_of: dict[str, str]) -> dict[str, list[str]]:
+    """Bucket function names by family, keeping meta order inside each bucket."""
+    families: dict[str, list[str]] = defaultdict(list)
+    for name, family in family_of.items():
+        families[family].append(name)
+    return dict(families)
+
+
+def _format_option(func_name: str) -> str:
+    return func_name
 
 
-def _format_option(func_name: str, profiles: dict[str, dict] | None) -> str:
-    return func_name
+def _semantic_ranking(
+    func_name: str,
+    all_funcs: list[str],
+    bits_of: dict[str, int] | None,
+    depth: int,
+    cache: dict[str, tuple[list[str], bool]] | None = None,
+    pool_bits: list[int] | None = None,
+) -> list[str]:
+    """Return at least depth other functions (or all of them) ranked by (shared tokens, name), highest first.
+
+    The ranking only depends on func_name, so with a cache each target is scored against the pool
+    once and later calls just filter the cached prefix; it is recomputed only when a deeper prefix is needed.
+    """
+    cached = cache.get(func_name) if cache is not None else None
+    if cached is not None:
+        ranking, complete = cached
+        if complete or len(ranking) >= depth:
+            return ranking
+    bits_of = bits_of or {}
+    if pool_bits is None:
+        pool_bits = [bits_of.get(f, 0) for f in all_funcs]
+    target_bits = bits_of.get(func_name, 0)
+    # Shared-token count = popcount of the AND of two bitsets; map() keeps the whole scan in C.
+    # Most pairs share no token at all, so only non-zero ANDs are popcounted and ranked.
+    overlaps = list(map(target_bits.__and__, pool_bits))
+    scores = map(int.bit_count, filter(None, overlaps))
+    # Only the top few are kept, so a bounded heap beats sorting the whole pool; (score, name)
+    # tuples compare natively, and one extra slot covers func_name itself being in the pool.
+    top = heapq.nlargest(depth + 1, zip(scores, compress(all_funcs, overlaps)))
+    ranking = [fn for _, fn in top if fn != func_name][:depth]
+    if len(ranking) < depth:
+        # Every overlapping name is already ranked; zero-score names follow in descending name order.
+        skip = set(ranking)
+        skip.add(func_name)
+        ranking.extend(heapq.nlargest(depth - len(ranking), (f for f in all_funcs if f not in skip)))
+    if cache is not None:
+        cache[func_name] = (ranking, len(ranking) < depth)
+    return ranking
 
 
 def _select_tool_distractors(
     func_name: str,
     all_funcs: list[str],
     max_count: int,
-    profiles: dict[str, dict] | None = None,
+    family_of: dict[str, str] | None = None,
+    bits_of: dict[str, int] | None = None,
     exclude: set[str] | None = None,
+    families: dict[str, list[str]] | None = None,
+    rankings: dict[str, tuple[list[str], bool]] | None = None,
+    pool_bits: list[int] | None = None,
+    func_index: dict[str, int] | None = None,
+    *,
+    rng: random.Random,
 ) -> list[str]:
     if max_count <= 0:
         return []
     exclude = set(exclude or set())
-    pool = [f for f in all_funcs if f != func_name and f not in exclude]
-    if not pool:
+    if func_index is None:
+        func_index = {name: idx for idx, name in enumerate(all_funcs)}
+    # Track unavailable names by pool index instead of materialising the filtered pool per call.
+    taken = {func_index[f] for f in exclude if f in func_index}
+    if func_name in func_index:
+        taken.add(func_index[func_name])
+    if len(taken) >= len(all_funcs):
         return []
 
-    profile = (profiles or {}).get(func_name) or {}
-    family_key = profile.get("family") or _function_family(func_name)
+    family_of = family_of or {}
+    family_key = family_of.get(func_name) or _function_family(func_name)
 
-    family_pool = [f for f in pool if ((profiles or {}).get(f) or {}).get("family") == family_key]
-    random.shuffle(family_pool)
+    if families is not None:
+        family_pool = [f for f in families.get(family_key, ()) if f != func_name and f not in exclude]
+    else:
+        family_pool = [
+            f for f in all_funcs if f != func_name and f not in exclude and family_of.get(f) == family_key
+        ]
+    rng.shuffle(family_pool)
     family_target = min(len(family_pool), max(1, int(round(max_count * 0.3))))
     family_sample = family_pool[:family_target]
 
-    def semantic_score(candidate: str) -> int:
-        cand_profile = (profiles or {}).get(candidate) or {}
-        cand_tokens = cand_profile.get("tokens") or set()
-        target_tokens = profile.get("tokens") or set()
-        return len(target_tokens & cand_tokens)
-
-    remaining_pool = [f for f in pool if f not in family_sample]
-    semantic_candidates = sorted(
-        remaining_pool,
-        key=lambda fn: (semantic_score(fn), fn),
-        reverse=True,
-    )
     semantic_target = max(0, max_count - len(family_sample) - 1)
-    semantic_sample = semantic_candidates[:semantic_target]
+    semantic_sample: list[str] = []
+    if semantic_target:
+        # Skipped names all come from exclude or family_sample, so this deep a prefix always suffices.
+        depth = semantic_target + len(exclude) + len(family_sample)
+        for fn in _semantic_ranking(func_name, all_funcs, bits_of, depth, rankings, pool_bits):
+            if fn in exclude or fn in family_sample:
+                continue
+            semantic_sample.append(fn)
+            if len(semantic_sample) >= semantic_target:
+                break
 
-    picked = list(dict.fromkeys(family_sample + semantic_sample))
+    # semantic_sample already skips family_sample and both hold distinct names, so no dedup pass is needed.
+    picked = family_sample + semantic_sample
     needed = max_count - len(picked)
     if needed > 0:
-        leftover = [f for f in pool if f not in picked]
-        random.shuffle(leftover)
-        picked.extend(leftover[:needed])
+        taken.update(func_index[f] for f in picked)
+        free = len(all_funcs) - len(taken)
+        if free <= 2 * needed:
+            leftover = [f for idx, f in enumerate(all_funcs) if idx not in taken]
+            picked.extend(rng.sample(leftover, min(needed, len(leftover))))
+        else:
+            # Most of the pool is free, so drawing random indices and rejecting taken ones
+            # finishes in a few tries instead of shuffling thousands of names.
+            while needed > 0:
+                idx = rng.randrange(len(all_funcs))
+                if idx in taken:
+                    continue
+                taken.add(idx)
+                picked.append(all_funcs[idx])
+                needed -= 1
 
     return picked[:max_count]
 
@@ -153,7 +269,14 @@ def question_available(
     available: list[str],
     all_funcs: list[str],
     num_neg: int,
-    profiles: dict[str, dict] | None = None,
+    family_of: dict[str, str] | None = None,
+    bits_of: dict[str, int] | None = None,
+    families: dict[str, list[str]] | None = None,
+    rankings: dict[str, tuple[list[str], bool]] | None = None,
+    pool_bits: list[int] | None = None,
+    func_index: dict[str, int] | None = None,
+    *,
+    rng: random.Random,
 ) -> dict | None:
     if not available:
         return None
@@ -173,7 +296,7 @@ def question_available(
     max_neg = max(1, num_neg)
     base_negatives = [name for name in deduped if name != func_name]
     if len(base_negatives) > max_neg:
-        base_negatives = random.sample(base_negatives, max_neg)
+        base_negatives = rng.sample(base_negatives, max_neg)
 
     needed = max_neg - len(base_negatives)
     if needed > 0:
@@ -182,15 +305,21 @@ def question_available(
             func_name,
             all_funcs,
             needed,
-            profiles=profiles,
+            family_of=family_of,
+            bits_of=bits_of,
             exclude=exclude,
+            families=families,
+            rankings=rankings,
+            pool_bits=pool_bits,
+            func_index=func_index,
+            rng=rng,
         )
         base_negatives.extend(extra)
 
-    options = [_format_option(name, profiles) for name in base_negatives]
-    correct_option = _format_option(func_name, profiles)
+    options = [_format_option(name) for name in base_negatives]
+    correct_option = _format_option(func_name)
     options.append(correct_option)
-    random.shuffle(options)
+    rng.shuffle(options)
     if len(options) < 2:
         return None
     return {
@@ -200,24 +329,26 @@ def question_available(
     }
 
 
-def _format_params(params: Iterable[str]) -> str:
-    ordered = sorted(params)
-    if not ordered:
-        return ""
-    if len(ordered) == 1:
-        return ordered[0]
-    return ", ".join(ordered)
+def _format_params(combo: tuple[str, ...]) -> str:
+    # Combos are sorted tuples already; join covers the empty and single-name cases too.
+    return ", ".join(combo)
 
 
-def question_params(func_name: str, meta: dict[str, dict], num_neg: int) -> dict | None:
+def _param_schema(func_name: str, meta: dict[str, dict]) -> tuple[dict, list]:
+    """Return (properties, required) from func_name's parameter schema."""
     info = meta.get(func_name, {})
     params = ((info.get("function") or {}).get("parameters") or info.get("parameters") or {})
-    required = params.get("required") or []
-    properties = params.get("properties") or {}
+    return params.get("properties") or {}, params.get("required") or []
+
+
+def _params_options(func_name: str, meta: dict[str, dict]) -> tuple[str, list[str]] | None:
+    """Return (correct_option, formatted distractor combos) for func_name; depends only on its schema."""
+    properties, required = _param_schema(func_name, meta)
     required_set = {p for p in required if p in properties}
     if not required_set:
         return None
-    correct_option = _format_params(required_set)
+    required_combo = tuple(sorted(required_set))
+    correct_option = _format_params(required_combo)
 
     other_params = [p for p in properties.keys() if p not in required_set]
     candidate_sets: list[tuple[str, ...]] = []
@@ -242,17 +373,38 @@ def question_params(func_name: str, meta: dict[str, dict], num_neg: int) -> dict
         # fall back to single-parameter distractors if possible
         for param in properties.keys():
             combo = (param,)
-            if combo != tuple(sorted(required_set)) and combo not in seen:
+            if combo != required_combo and combo not in seen:
                 seen.add(combo)
                 candidate_sets.append(combo)
         if not candidate_sets:
             return None
 
-    k = min(num_neg, len(candidate_sets))
-    sampled = random.sample(candidate_sets, k)
-    negs = [_format_params(combo) for combo in sampled]
+    return correct_option, [_format_params(combo) for combo in candidate_sets]
+
+
+def question_params(
+    func_name: str,
+    meta: dict[str, dict],
+    num_neg: int,
+    cache: dict[str, tuple[str, list[str]] | None] | None = None,
+    *,
+    rng: random.Random,
+) -> dict | None:
+    # The option table is a pure function of the schema, so it is built once per function name.
+    if cache is None:
+        table = _params_options(func_name, meta)
+    elif func_name in cache:
+        table = cache[func_name]
+    else:
+        table = cache[func_name] = _params_options(func_name, meta)
+    if table is None:
+        return None
+    correct_option, candidate_options = table
+
+    k = min(num_neg, len(candidate_options))
+    negs = rng.sample(candidate_options, k)
     options = negs + [correct_option]
-    random.shuffle(options)
+    rng.shuffle(options)
     return {
         "question": f"When calling {func_name}, which parameters must be provided? (Select all that apply)",
         "options": options,
@@ -270,27 +422,49 @@ class ParamPool:
         self.params = data.get("params") or {}
         self.types = data.get("types") or {}
         self.global_mix_prob = min(max(global_mix_prob, 0.0), 1.0)
+        # Each entry's clusters are keyed once up front as [(value, canonical key)] lists, with
+        # (function, param) flattened, so sample() needs a single dict hit per level, never
+        # re-serialises a candidate, and forked workers share the prepared lists.
+        self.function_clusters = {
+            (func_name, param_name): self._key_clusters(entry)
+            for func_name, func_entry in self.functions.items()
+            for param_name, entry in ((func_entry or {}).get("params") or {}).items()
+        }
+        self.param_clusters = {name: self._key_clusters(entry) for name, entry in self.params.items()}
+        self.type_clusters = {name: self._key_clusters(entry) for name, entry in self.types.items()}
 
     @property
     def enabled(self) -> bool:
         return bool(self.functions or self.params or self.types)
 
-    def sample(self, func_name: str, param_name: str, param_type: str | None, original):
-        """Return a value different from original, prioritizing same function/parameter history."""
-        func_entry = (self.functions.get(func_name) or {}).get("params", {}).get(param_name)
-        param_entry = self.params.get(param_name)
-        type_entry = self.types.get(param_type) if param_type else None
-
-        prefer_global = random.random() < self.global_mix_prob
-        search_order: list[dict | None] = []
-        if not prefer_global:
-            search_order.append(func_entry)
-        search_order.extend([param_entry, type_entry])
-        if prefer_global:
-            search_order.append(func_entry)
+    def sample(
+        self,
+        func_name: str,
+        param_name: str,
+        param_type: str | None,
+        original,
+        rng: random.Random,
+        original_key: str | None = None,
+    ):
+        """Return a value different from original, prioritizing same function/parameter history.
+
+        original_key may carry a precomputed _canonical(original) for callers that sample the same
+        argument repeatedly.
+        """
+        func_entry = self.function_clusters.get((func_name, param_name))
+        param_entry = self.param_clusters.get(param_name)
+        type_entry = self.type_clusters.get(param_type) if param_type else None
+
+        if rng.random() < self.global_mix_prob:
+            search_order = (param_entry, type_entry, func_entry)
+        else:
+            search_order = (func_entry, param_entry, type_entry)
 
+        # Up to three entries are searched; canonicalise original once for all of them.
+        if original_key is None:
+            original_key = self._canonical(original)
         for entry in search_order:
-            candidate = self._pick_alternative(entry, original)
+            candidate = self._pick_alternative(entry, original_key, rng)
             if candidate is not None:
                 return candidate
         return None
@@ -302,21 +476,32 @@ class ParamPool:
         except (TypeError, ValueError):
             return str(value)
 
-    def _pick_alternative(self, entry: dict | None, original):
+    @classmethod
+    def _key_clusters(cls, entry: dict | None) -> list[list[tuple]]:
         if not entry:
+            return []
+        return [
+            [(value, cls._canonical(value)) for value in (cluster.get("values") or [])]
+            for cluster in (entry.get("clusters") or {}).values()
+        ]
+
+    def _pick_alternative(self, clusters: list[list[tuple]] | None, original_key: str, rng: random.Random):
+        if not clusters:
             return None
-        original_key = self._canonical(original)
-        clusters = list((entry.get("clusters") or {}).values())
-        random.shuffle(clusters)
-        for cluster in clusters:
-            values = cluster.get("values") or []
-            if not values:
+        clusters = clusters[:]
+        rng.shuffle(clusters)
+        for pairs in clusters:
+            if not pairs:
                 continue
-            pool = list(values)
-            random.shuffle(pool)
-            for value in pool:
-                if self._canonical(value) != original_key:
+            # Any value but the original, uniformly: a couple of random probes almost always hit one
+            # (at most one value usually matches), so the cluster is neither copied nor shuffled.
+            for _ in range(2):
+                value, key = pairs[rng.randrange(len(pairs))]
+                if key != original_key:
                     return value
+            others = [value for value, key in pairs if key != original_key]
+            if others:
+                return rng.choice(others)
         return None
 
 
@@ -335,35 +520,72 @@ def load_param_pool(path: Path | None) -> ParamPool:
     return ParamPool(data)
 
 
-def _drop_argument(args: dict, candidate_fields: list[str]) -> dict | None:
-    """Return a copy missing one of the candidate fields."""
+# Override marker for an argument a distractor leaves out.
+_DROP = object()
+
+
+def _drop_argument(args: dict, candidate_fields: list[str], rng: random.Random) -> dict | None:
+    """Return overrides dropping one of the candidate fields, or None if nothing would remain."""
     if not args or not candidate_fields:
         return None
-    field = random.choice(candidate_fields)
-    mutated = dict(args)
-    mutated.pop(field, None)
-    if mutated == args or not mutated:
+    field = rng.choice(candidate_fields)
+    if field not in args or len(args) < 2:
         return None
-    return mutated
+    return {field: _DROP}
+
 
+def _mutate_with_pool(
+    func_name: str,
+    args: dict,
+    properties: dict,
+    pool: ParamPool,
+    rng: random.Random,
+    field_keys: dict[str, tuple[str | None, str]] | None = None,
+) -> dict | None:
+    """Return overrides replacing one or two fields with pool values.
 
-def _mutate_with_pool(func_name: str, args: dict, properties: dict, pool: ParamPool) -> dict | None:
+    field_keys caches (schema type, canonical value) per field across calls on the same args.
+    """
     if not pool or not pool.enabled or not args:
         return None
-    mutated = dict(args)
+    if field_keys is None:
+        field_keys = {}
     fields = list(args.keys())
     max_fields = min(2, len(fields))
-    k = random.randint(1, max_fields)
-    changed = False
-    for field in random.sample(fields, k):
-        prop = properties.get(field) or {}
-        schema_type = infer_param_type(prop, args[field])
-        replacement = pool.sample(func_name, field, schema_type, args[field])
+    k = rng.randint(1, max_fields)
+    overrides = {}
+    for field in rng.sample(fields, k):
+        original = args[field]
+        keyed = field_keys.get(field)
+        if keyed is None:
+            keyed = field_keys[field] = (
+                infer_param_type(properties.get(field) or {}, original),
+                pool._canonical(original),
+            )
+        schema_type, original_key = keyed
+        replacement = pool.sample(func_name, field, schema_type, original, rng, original_key)
         if replacement is None:
             continue
-        mutated[field] = replacement
-        changed = True
-    return mutated if changed else None
+        overrides[field] = replacement
+    return overrides or None
+
+
+def _format_variant(ordered: list[str], dumped: dict[str, str], overrides: dict) -> str:
+    """format_arg_values of args with overrides applied; ordered/dumped are args' sorted keys and dumps."""
+    pairs = []
+    for key in ordered:
+        if key in overrides:
+            value = overrides[key]
+            if value is _DROP:
+                continue
+            pairs.append(f"{key}={json.dumps(value, ensure_ascii=False)}")
+        else:
+            pairs.append(f"{key}={dumped[key]}")
+    return "; ".join(pairs)
+
+
+# Mutation strategies for param_values distractors; "pool" is listed twice to weight it.
+_VALUE_STRATEGIES = ("pool", "pool", "drop_required", "drop_any")
 
 
 def question_param_values(
@@ -372,6 +594,9 @@ def question_param_values(
     meta: dict[str, dict],
     num_neg: int,
     pool: ParamPool | None = None,
+    schemas: dict[str, tuple[dict, list]] | None = None,
+    *,
+    rng: random.Random,
 ) -> dict | None:
     args = parse_arguments(fc)
     if not args:
@@ -379,31 +604,42 @@ def question_param_values(
     if not pool or not pool.enabled:
         return None
 
-    info = meta.get(func_name, {})
-    params = ((info.get("function") or {}).get("parameters") or info.get("parameters") or {})
-    properties = params.get("properties") or {}
-
-    correct_option = format_arg_values(args)
+    # The (properties, required) pair only depends on the function, so it is looked up once per name.
+    if schemas is None:
+        properties, required = _param_schema(func_name, meta)
+    elif func_name in schemas:
+        properties, required = schemas[func_name]
+    else:
+        properties, required = schemas[func_name] = _param_schema(func_name, meta)
+
+    # Serialise and sort the arguments once; variants are small override dicts on top of them
+    # and only re-dump the one or two fields they replace.
+    dumped = {key: json.dumps(value, ensure_ascii=False) for key, value in args.items()}
+    ordered = sorted(args)
+    correct_option = _format_variant(ordered, dumped, {})
     variations: set[str] = set()
     attempts = 0
     max_attempts = num_neg * 8
-    required_fields = [p for p in params.get("required") or [] if p in args]
+    required_fields = [p for p in required if p in args]
+    all_fields = list(args.keys())
+    # Schema type and canonical key of each argument, filled on first pool mutation of that field.
+    field_keys: dict[str, tuple[str | None, str]] = {}
+    choice = rng.choice
 
     while len(variations) < num_neg and attempts < max_attempts:
         attempts += 1
-        strategies = ["pool", "pool", "drop_required", "drop_any"]
-        strategy = random.choice(strategies)
+        strategy = choice(_VALUE_STRATEGIES)
         if strategy == "pool":
-            mutated = _mutate_with_pool(func_name, args, properties, pool)
+            overrides = _mutate_with_pool(func_name, args, properties, pool, rng, field_keys)
         elif strategy == "drop_required" and required_fields:
-            mutated = _drop_argument(args, required_fields)
+            overrides = _drop_argument(args, required_fields, rng)
         elif strategy == "drop_any":
-            mutated = _drop_argument(args, list(args.keys()))
+            overrides = _drop_argument(args, all_fields, rng)
         else:
-            mutated = None
-        if not mutated:
+            overrides = None
+        if not overrides:
             continue
-        option = format_arg_values(mutated)
+        option = _format_variant(ordered, dumped, overrides)
         if option and option != correct_option:
             variations.add(option)
 
@@ -412,9 +648,9 @@ def question_param_values(
 
     options = list(variations)
     if len(options) > num_neg:
-        options = random.sample(options, num_neg)
+        options = rng.sample(options, num_neg)
     options.append(correct_option)
-    random.shuffle(options)
+    rng.shuffle(options)
 
     return {
         "question": f"For the call to {func_name}, which parameter values are correct?",
@@ -431,16 +667,119 @@ QUESTION_BUILDERS = {
 }
 
 
+@dataclass
+class BuildContext:
+    """Lookup tables shared by every question builder, loaded once per process."""
+
+    meta: dict[str, dict]
+    all_functions: list[str]
+    family_of: dict[str, str]
+    bits_of: dict[str, int]
+    description_of: dict[str, str]
+    families: dict[str, list[str]]
+    # Token bitsets aligned with all_functions, for scanning the pool without dict lookups.
+    function_bits: list[int]
+    # Position of each name in all_functions.
+    function_index: dict[str, int]
+    param_pool: ParamPool
+    negatives: int
+    # Per-target semantic rankings, filled lazily by the available mode.
+    rankings: dict[str, tuple[list[str], bool]] = field(default_factory=dict)
+    # Per-function params-mode option tables, filled lazily.
+    params_options: dict[str, tuple[str, list[str]] | None] = field(default_factory=dict)
+    # Per-function (properties, required) schemas for the param_values mode, filled lazily.
+    param_schemas: dict[str, tuple[dict, list]] = field(default_factory=dict)
+
+
+def load_build_context(stats_path: Path, negatives: int, param_pool_path: Path | None = None) -> BuildContext:
+    meta = load_meta(stats_path)
+    family_of, bits_of, description_of = _build_function_profiles(meta)
+    all_functions = list(meta.keys())
+    return BuildContext(
+        meta=meta,
+        all_functions=all_functions,
+        family_of=family_of,
+        bits_of=bits_of,
+        description_of=description_of,
+        families=_group_families(family_of),
+        function_bits=[bits_of[name] for name in all_functions],
+        function_index={name: idx for idx, name in enumerate(all_functions)},
+        param_pool=load_param_pool(param_pool_path),
+        negatives=negatives,
+    )
+
+
+def build_record_entries(record: dict, mode: str, ctx: BuildContext, rng: random.Random) -> Iterator[dict]:
+    """Yield one HAS-API entry per function call in record for the given mode."""
+    # Resolve the mode once per record rather than branching again for every function call.
+    if mode == "available":
+        available = parse_available_tools(record)
+
+        def build(func_name: str, fc: dict) -> dict | None:
+            return question_available(
+                func_name,
+                available,
+                ctx.all_functions,
+                ctx.negatives,
+                ctx.family_of,
+                ctx.bits_of,
+                ctx.families,
+                ctx.rankings,
+                ctx.function_bits,
+                ctx.function_index,
+                rng=rng,
+            )
+
+    elif mode == "params":
+
+        def build(func_name: str, fc: dict) -> dict | None:
+            return question_params(func_name, ctx.meta, ctx.negatives, ctx.params_options, rng=rng)
+
+    elif mode == "param_values":
+
+        def build(func_name: str, fc: dict) -> dict | None:
+            return question_param_values(
+                func_name, fc, ctx.meta, ctx.negatives, ctx.param_pool, ctx.param_schemas, rng=rng
+            )
+
+    else:
+        return
+
+    record_uuid = record.get("uuid")
+    for msg_idx, fc in iter_function_calls(record):
+        func_name = fc["name"]
+        result = build(func_name, fc)
+        if not result:
+            continue
+
+        yield {
+            "mode": mode,
+            "question": result["question"],
+            "options": result["options"],
+            "answer": result["answer"],
+            "function_name": func_name,
+            "record_uuid": record_uuid,
+            "message_index": msg_idx,
+        }
+
+
 def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(description="Build HAS-API MCQ data without LLM.")
     parser.add_argument("-i", "--input", type=Path, required=True, help="Source jsonl data.")
     parser.add_argument("-s", "--stats", type=Path, required=True, help="function_meta JSON.")
-    parser.add_argument("-o", "--output", type=Path, required=True, help="Output jsonl.")
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=Path,
+        required=True,
+        help="Output jsonl; with several --mode values each mode writes <stem>_<mode><suffix> beside it.",
+    )
     parser.add_argument(
         "--mode",
+        nargs="+",
         choices=list(QUESTION_BUILDERS.keys()),
         required=True,
-        help="Strategy for generating options.",
+        help="Strategy (or strategies) for generating options; several modes share one pass over the input.",
     )
     parser.add_argument(
         "--negatives",
@@ -456,62 +795,151 @@ def parse_args() -> argparse.Namespace:
         default=Path("stats/param_pool.json"),
         help="Parameter pool JSON produced by build_param_pool.py (param_values mode).",
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help=(
+            f"Worker processes. Above 1 the input is split into chunks of {CHUNK_RECORDS} records, each with "
+            "its own RNG seeded from --seed and the chunk index: output is reproducible for any worker count "
+            "but differs from the single-process stream."
+        ),
+    )
     return parser.parse_args()
 
 
+def mode_output_path(output: Path, mode: str, multi: bool) -> Path:
+    if not multi:
+        return output
+    return output.with_name(f"{output.stem}_{mode}{output.suffix}")
+
+
+def build_chunk(lines: list[bytes], modes: list[str], seed: int, chunk_idx: int) -> dict[str, list[str]]:
+    """Worker task: return each mode's serialised entries for one chunk of raw jsonl lines."""
+    records = list(parse_jsonl_lines(lines))
+    ctx = get_state()
+    out = {}
+    for mode in modes:
+        # Seeded by chunk, not by worker, so results do not depend on how chunks are scheduled.
+        rng = random.Random(f"{seed}:{chunk_idx}")
+        out[mode] = [
+            json.dumps(entry, ensure_ascii=False)
+            for record in records
+            for entry in build_record_entries(record, mode, ctx, rng)
+        ]
+    return out
+
+
+def _write_limited(sink, lines: list[str], produced: dict[str, int], mode: str, max_samples: int | None) -> bool:
+    """Write lines for mode up to max_samples; return False once the limit is reached."""
+    if max_samples:
+        lines = lines[: max_samples - produced[mode]]
+    if lines:
+        lines.append("")
+        sink.write("\n".join(lines))
+        produced[mode] += len(lines) - 1
+    return not max_samples or produced[mode] < max_samples
+
+
+def generate_sequential(
+    records: Iterable[dict],
+    modes: list[str],
+    ctx: BuildContext,
+    seed: int,
+    sinks: dict,
+    produced: dict[str, int],
+    max_samples: int | None = None,
+) -> None:
+    """Write each mode's entries for records to sinks[mode], stopping a mode once it has max_samples."""
+    # One RNG per mode keeps each output identical to a single-mode run with the same seed.
+    rngs = {mode: random.Random(seed) for mode in modes}
+    active = set(modes)
+    for record in records:
+        for mode in modes:
+            if mode not in active:
+                continue
+            # json.dumps encodes in one C call; a record's lines then go out in a single write.
+            lines = []
+            for entry in build_record_entries(record, mode, ctx, rngs[mode]):
+                lines.append(json.dumps(entry, ensure_ascii=False))
+                produced[mode] += 1
+                if max_samples and produced[mode] >= max_samples:
+                    active.discard(mode)
+                    break
+            if lines:
+                lines.append("")
+                sinks[mode].write("\n".join(lines))
+        if not active:
+            break
+
+
+def generate_parallel(args: argparse.Namespace, modes: list[str], sinks: dict, produced: dict[str, int]) -> None:
+    """Fan chunks of raw lines out to worker processes and write their results back in input order."""
+    param_pool_path = args.param_pool if "param_values" in modes else None
+    init_args = (load_build_context, args.stats, args.negatives, param_pool_path)
+    preload_state(*init_args)
+
+    active = set(modes)
+    with args.input.open("rb", buffering=READ_BUFFER_BYTES) as fh, ProcessPoolExecutor(
+        max_workers=args.workers, initializer=init_worker, initargs=init_args
+    ) as executor:
+        pending = deque()
+        chunk_idx = 0
+
+        def submit_next() -> None:
+            nonlocal chunk_idx
+            lines = list(islice(fh, CHUNK_RECORDS))
+            if lines:
+                pending.append(executor.submit(build_chunk, lines, modes, args.seed, chunk_idx))
+                chunk_idx += 1
+
+        # Keep a bounded window of chunks in flight so huge inputs are never read ahead in full.
+        for _ in range(args.workers * 2):
+            submit_next()
+        while pending and active:
+            result = pending.popleft().result()
+            submit_next()
+            for mode in modes:
+                if mode in active and not _write_limited(sinks[mode], result[mode], produced, mode, args.max_samples):
+                    active.discard(mode)
+        for future in pending:
+            future.cancel()
+
+
 def main() -> None:
     args = parse_args()
-    random.seed(args.seed)
-
-    meta = load_meta(args.stats)
-    function_profiles = _build_function_profiles(meta)
-    all_functions = list(meta.keys())
-    builder = QUESTION_BUILDERS[args.mode]
-    produced = 0
-    param_pool = load_param_pool(args.param_pool) if args.mode == "param_values" else ParamPool(None)
+    modes = list(dict.fromkeys(args.mode))
+    multi = len(modes) > 1
+    produced = {mode: 0 for mode in modes}
 
     args.output.parent.mkdir(parents=True, exist_ok=True)
-    with args.output.open("w", encoding="utf-8") as sink:
-        for record in load_jsonl(args.input):
-            available = parse_available_tools(record)
-            for msg_idx, fc in iter_function_calls(record):
-                func_name = fc["name"]
-                if args.mode == "available":
-                    result = builder(
-                        func_name,
-                        available,
-                        all_functions,
-                        args.negatives,
-                        function_profiles,
-                    )
-                elif args.mode == "params":
-                    result = builder(func_name, meta, args.negatives)
-                elif args.mode == "param_values":
-                    result = builder(func_name, fc, meta, args.negatives, param_pool)
-                else:
-                    result = None
-
-                if not result:
-                    continue
-
-                entry = {
-                    "mode": args.mode,
-                    "question": result["question"],
-                    "options": result["options"],
-                    "answer": result["answer"],
-                    "function_name": func_name,
-                    "record_uuid": record.get("uuid"),
-                    "message_index": msg_idx,
-                }
-                json.dump(entry, sink, ensure_ascii=False)
-                sink.write("\n")
-                produced += 1
-                if args.max_samples and produced >= args.max_samples:
-                    break
-            if args.max_samples and produced >= args.max_samples:
-                break
-
-    print(f"[INFO] Generated {produced} HAS-API entries using mode={args.mode}.")
+    paths = {mode: mode_output_path(args.output, mode, multi) for mode in modes}
+    # Outputs are written beside their targets and renamed only after a complete run,
+    # so an interrupted build never leaves a truncated file behind under the final name.
+    tmp_paths = {mode: path.with_name(f"{path.name}.tmp") for mode, path in paths.items()}
+    sinks = {}
+    completed = False
+    try:
+        for mode in modes:
+            sinks[mode] = tmp_paths[mode].open("w", encoding="utf-8", buffering=WRITE_BUFFER_BYTES)
+        if args.workers > 1:
+            generate_parallel(args, modes, sinks, produced)
+        else:
+            param_pool_path = args.param_pool if "param_values" in modes else None
+            ctx = load_build_context(args.stats, args.negatives, param_pool_path)
+            generate_sequential(load_jsonl(args.input), modes, ctx, args.seed, sinks, produced, args.max_samples)
+        completed = True
+    finally:
+        for sink in sinks.values():
+            sink.close()
+        for mode, tmp_path in tmp_paths.items():
+            if completed:
+                os.replace(tmp_path, paths[mode])
+            else:
+                tmp_path.unlink(missing_ok=True)
+
+    for mode in modes:
+        print(f"[INFO] Generated {produced[mode]} HAS-API entries using mode={mode}.")
 
 
 if __name__ == "__main__":
@@ -15,6 +15,7 @@ import argparse
 import json
 import sys
 import concurrent.futures
+import multiprocessing
 import os
 from collections import defaultdict
 from datetime import datetime
@@ -35,6 +36,7 @@ if str(SCRIPTS_ROOT) not in sys.path:
     sys.path.append(str(SCRIPTS_ROOT))
 
 from utils.has_utils import (
+    find_jsonl_files,
     infer_param_type,
     iter_function_calls,
     load_jsonl,
@@ -49,7 +51,9 @@ WORKER_MAX_VALUES: int = 0
 
 def _worker_init(meta_path: str, max_values: int):
     global WORKER_META, WORKER_MAX_VALUES
-    WORKER_META = load_meta(Path(meta_path))
+    # Meta already loaded in this process (sequential run, or inherited via fork) is reused as-is.
+    if WORKER_META is None:
+        WORKER_META = load_meta(Path(meta_path))
     WORKER_MAX_VALUES = max_values
 
 
@@ -121,7 +125,7 @@ def discover_files(path: Path) -> list[Path]:
         return [path]
     if not path.exists():
         return []
-    return sorted(p for p in path.rglob("*.jsonl") if p.is_file())
+    return find_jsonl_files(path)
 
 
 def classify_string(value: str) -> str:
@@ -329,8 +333,12 @@ def main() -> None:
     files = discover_files(args.input)
     if not files:
         raise SystemExit(f"No jsonl files found under: {args.input}")
+    global WORKER_META
     meta = load_meta(args.stats)
     builder = PoolBuilder(meta, max_values=args.max_values)
+    # Sequential runs and forked workers share the parsed meta instead of reading the stats JSON again.
+    if args.workers <= 1 or multiprocessing.get_start_method() == "fork":
+        WORKER_META = meta
 
     total_records = 0
     total_calls = 0
@@ -52,9 +52,9 @@ def convert(
 
     if sample_size:
         reservoir: list[dict] = []
-        if seed is not None:
-            random.seed(seed)
-        
+        # A private generator seeded like the old global one, with randint bound for the per-row draw.
+        randint = random.Random(seed).randint
+
         seen = 0
         cap = sample_size
         with output_path.open("w", encoding="utf-8") as sink:
@@ -65,7 +65,7 @@ def convert(
                 if len(reservoir) < cap:
                     reservoir.append(row)
                 else:
-                    j = random.randint(1, seen)
+                    j = randint(1, seen)
                     if j <= cap:
                         reservoir[j - 1] = row
             for row in reservoir:
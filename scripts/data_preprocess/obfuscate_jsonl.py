@@ -23,23 +23,19 @@ if str(REPO_ROOT) not in sys.path:
     sys.path.append(str(REPO_ROOT))
 
 from scripts.utils.function_alias import load_alias_map, apply_alias
+from scripts.utils.has_utils import find_jsonl_files, load_jsonl, loads_json
 
 _WORKER_ALIAS: dict[str, str] | None = None
 
 
 def obfuscate_file(src: Path, dst: Path, alias_map: dict[str, str]) -> None:
     dst.parent.mkdir(parents=True, exist_ok=True)
-    with src.open("r", encoding="utf-8") as fh_in, dst.open("w", encoding="utf-8") as fh_out:
-        for line in fh_in:
-            line = line.strip()
-            if not line:
-                continue
-            try:
-                record = json.loads(line)
-            except json.JSONDecodeError:
-                continue
+    with dst.open("w", encoding="utf-8") as fh_out:
+        # load_jsonl reads raw bytes with the simdjson fast path; json.dumps encodes each record in
+        # one C call where json.dump would push every fragment through a separate write.
+        for record in load_jsonl(src):
             new_record = mask_record(record, alias_map)
-            json.dump(new_record, fh_out, ensure_ascii=False)
+            fh_out.write(json.dumps(new_record, ensure_ascii=False))
             fh_out.write("\n")
 
 
@@ -60,7 +56,7 @@ def worker_task(task: tuple[str, str, str]) -> str:
 def parse_json_field(value):
     if isinstance(value, str):
         try:
-            parsed = json.loads(value)
+            parsed = loads_json(value)
             return parsed, True
         except json.JSONDecodeError:
             return value, False
@@ -205,7 +201,7 @@ def main() -> None:
     if not args.input.exists():
         raise SystemExit(f"Input directory not found: {args.input}")
 
-    src_files = sorted(args.input.rglob("*.jsonl"))
+    src_files = find_jsonl_files(args.input)
     if not src_files:
         raise SystemExit(f"No jsonl files found under {args.input}")
 
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Check that shard discovery keeps the sorted(Path.rglob()) order it replaced.
+
+Run with:
+    python -m unittest discover -s scripts/tests
+"""
+
+from __future__ import annotations
+
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+SCRIPTS_ROOT = Path(__file__).resolve().parents[1]
+if str(SCRIPTS_ROOT) not in sys.path:
+    sys.path.append(str(SCRIPTS_ROOT))
+
+from data_preprocess.build_param_pool import discover_files  # noqa: E402
+from utils.has_utils import find_jsonl_files  # noqa: E402
+
+
+class DiscoverFilesTest(unittest.TestCase):
+    def test_matches_sorted_rglob_with_sibling_prefixes(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            # "a-c" and "a.b" sort before "a/" as strings but after it as path parts.
+            for rel in ("a/b.jsonl", "a-c/x.jsonl", "a.b/z/q.jsonl", "A/k.jsonl", "a0.jsonl", "top.jsonl"):
+                path = root / rel
+                path.parent.mkdir(parents=True, exist_ok=True)
+                path.touch()
+            (root / "a" / "notes.txt").touch()
+            (root / "dir.jsonl").mkdir()
+
+            expected = sorted(p for p in root.rglob("*.jsonl") if p.is_file())
+            self.assertEqual(discover_files(root), expected)
+            self.assertEqual(find_jsonl_files(root), expected)
+
+    def test_missing_root_is_empty(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            missing = Path(tmp) / "missing"
+            self.assertEqual(discover_files(missing), [])
+            self.assertEqual(find_jsonl_files(missing), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
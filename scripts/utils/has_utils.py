@@ -3,22 +3,74 @@
 
 from __future__ import annotations
 
+import codecs
 import json
+import os
 from pathlib import Path
 from typing import Iterable
 
+try:
+    import simdjson
+except ImportError:  # pragma: no cover - optional speedup
+    simdjson = None
+
+# Read-ahead for load_jsonl; large shards need far fewer read() calls than with the 8 KiB default.
+READ_BUFFER_BYTES = 1 << 20
+# Write buffer for jsonl outputs; entries are flushed to disk in large blocks.
+WRITE_BUFFER_BYTES = 1 << 20
+
+
+def loads_json(data: bytes | str):
+    """json.loads with the simdjson fast path when available."""
+    # simdjson raises (RuntimeError: BIGINT_ERROR) instead of rounding ints wider than 64 bits,
+    # so those documents, like malformed ones, fall back to json.
+    if simdjson is not None:
+        try:
+            return simdjson.loads(data)
+        except (ValueError, RuntimeError):
+            pass
+    return json.loads(data)
+
+
+def parse_jsonl_lines(lines: Iterable[bytes]) -> Iterable[dict]:
+    """Yield json objects from raw jsonl lines, skipping blank, non-object and malformed ones."""
+    for line in lines:
+        # Records start with "{"; blank or stray lines are dropped on a byte check instead of a failed
+        # parse, and only indented or BOM-prefixed lines pay for a strip.
+        if line[:1] != b"{":
+            line = line.strip().removeprefix(codecs.BOM_UTF8)
+            if line[:1] != b"{":
+                continue
+        try:
+            yield loads_json(line)
+        except json.JSONDecodeError:
+            continue
+
 
 def load_jsonl(path: Path) -> Iterable[dict]:
     """Yield json objects from a jsonl file, skipping malformed lines."""
-    with path.open("r", encoding="utf-8") as fh:
-        for raw in fh:
-            line = raw.strip()
-            if not line:
-                continue
-            try:
-                yield json.loads(line)
-            except json.JSONDecodeError:
-                continue
+    with path.open("rb", buffering=READ_BUFFER_BYTES) as fh:
+        yield from parse_jsonl_lines(fh)
+
+
+def find_jsonl_files(root: Path) -> list[Path]:
+    """Return every *.jsonl file under root, sorted; walks with os.scandir instead of rglob."""
+    stack = [os.fspath(root)]
+    found: list[Path] = []
+    while stack:
+        # Like rglob, a missing root or an unreadable directory yields nothing instead of raising.
+        try:
+            with os.scandir(stack.pop()) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.name.endswith(".jsonl") and entry.is_file():
+                        found.append(Path(entry.path))
+        except OSError:
+            continue
+    # Path order compares parts, so "a/b.jsonl" stays ahead of "a-c/x.jsonl" as with sorted(rglob()).
+    found.sort()
+    return found
 
 
 def load_meta(stats_path: Path) -> dict[str, dict]:
@@ -31,8 +83,9 @@ def iter_function_calls(record: dict):
     """Iterate over (message_index, function_call) pairs inside a record."""
     messages = record.get("messages")
     if isinstance(messages, str):
+        # messages is usually itself a large JSON-encoded string; decode it on the fast path too.
         try:
-            messages = json.loads(messages)
+            messages = loads_json(messages)
         except json.JSONDecodeError:
             return
     if not isinstance(messages, list):
@@ -66,11 +119,24 @@ def format_arg_values(args: dict) -> str:
     return "; ".join(pairs)
 
 
+# Exact JSON value types -> schema names. bool must stay ahead of int for the subclass fallback.
+_PY_TYPE_NAMES = {
+    bool: "boolean",
+    int: "integer",
+    float: "number",
+    str: "string",
+    list: "array",
+    dict: "object",
+}
+
+
 def infer_param_type(schema: dict | None, value, default: str | None = None) -> str | None:
     """Best-effort inference of parameter type, falling back to runtime value."""
-    schema = schema or {}
-    declared = schema.get("type")
-    if isinstance(declared, list):
+    declared = schema.get("type") if schema else None
+    if isinstance(declared, str):
+        if declared:
+            return declared
+    elif isinstance(declared, list):
         chosen = None
         for candidate in declared:
             if isinstance(candidate, str) and candidate != "null":
@@ -78,23 +144,15 @@ def infer_param_type(schema: dict | None, value, default: str | None = None) ->
                 break
         if chosen is None and declared:
             chosen = declared[0]
-        declared = chosen
-    if declared and not isinstance(declared, str):
-        declared = None
-    if declared:
-        return declared
-    if isinstance(value, bool):
-        return "boolean"
-    if isinstance(value, int) and not isinstance(value, bool):
-        return "integer"
-    if isinstance(value, float):
-        return "number"
-    if isinstance(value, str):
-        return "string"
-    if isinstance(value, list):
-        return "array"
-    if isinstance(value, dict):
-        return "object"
+        if chosen and isinstance(chosen, str):
+            return chosen
+    # Decoded JSON only yields the exact builtins, so one dict hit replaces the isinstance chain.
+    name = _PY_TYPE_NAMES.get(type(value))
+    if name is not None:
+        return name
+    for py_type, name in _PY_TYPE_NAMES.items():
+        if isinstance(value, py_type):
+            return name
     return default
 
 
@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+"""Read-only state shared by the worker processes of a ProcessPoolExecutor."""
+
+from __future__ import annotations
+
+import multiprocessing
+from typing import Any, Callable
+
+_STATE: Any = None
+
+
+def load_state(loader: Callable[..., Any], *args) -> None:
+    """Build the state with loader(*args) and keep it for this process."""
+    global _STATE
+    _STATE = loader(*args)
+
+
+def preload_state(loader: Callable[..., Any], *args) -> None:
+    """Load the state in the parent when workers fork, so they inherit it copy-on-write."""
+    if multiprocessing.get_start_method() == "fork":
+        load_state(loader, *args)
+
+
+def init_worker(loader: Callable[..., Any], *args) -> None:
+    """Pool initializer: reuse state inherited via fork; otherwise load it once per worker process."""
+    if _STATE is None:
+        load_state(loader, *args)
+
+
+def get_state() -> Any:
+    """Return the state set by load_state, or None when none has been loaded."""
+    return _STATE